@@ -0,0 +1,78 @@
+""" микро-бенчмарк шага ESN: задержка и выделение памяти на шаг до и после перехода на постоянные буферы """
+import copy, json, sys, time, tracemalloc
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from esn import EchoStateNetwork
+
+
+def legacy_update_state(res, input_vector):
+    """ прежняя реализация Reservoir.update_state (новые массивы на каждом шаге) """
+    input_vector_with_bias = np.vstack((np.ones((1, 1), dtype=res.dtype), input_vector.astype(res.dtype)))
+    pre_activation = res.W.dot(res.state) + np.dot(res.W_in, input_vector_with_bias)
+    updated = np.tanh(pre_activation)
+    res.state = (1 - res.leaking_rate) * res.state + res.leaking_rate * updated
+    return res.state.flatten()
+
+
+def legacy_predict(esn, input_vector):
+    """ прежняя реализация EchoStateNetwork.predict """
+    input_vector = np.asarray(input_vector, dtype=esn.dtype)
+    state = legacy_update_state(esn.reservoir, input_vector.reshape(-1, 1))
+    state_with_bias = np.concatenate([np.ones(1, dtype=esn.dtype), state])
+    prediction = np.dot(esn.W_out, state_with_bias)
+    if np.linalg.norm(prediction) > 1:
+        prediction = prediction / np.linalg.norm(prediction)
+    direction = np.array([input_vector[2] - input_vector[0], input_vector[3] - input_vector[1]])
+    direction = direction / (np.linalg.norm(direction) + 1e-6)
+    error = prediction - direction
+    reward = esn.reward_function(input_vector)
+    scaled_reward = esn.dtype.type(np.tanh(reward / 100.0))
+    gradient = 2 * error[:, np.newaxis] * state_with_bias
+    esn.W_out -= esn.learning_rate * scaled_reward * gradient
+    return prediction * esn.max_vel
+
+
+def measure(step, esn, inputs):
+    """ средняя задержка шага (мкс) и пик дополнительной памяти на шаг (байт) """
+    for x in inputs[:10]:
+        step(esn, x)
+    start = time.perf_counter()
+    for x in inputs:
+        step(esn, x)
+    latency = (time.perf_counter() - start) / len(inputs) * 1e6
+
+    tracemalloc.start()
+    peak = 0
+    for x in inputs[:50]:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        step(esn, x)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return latency, peak
+
+
+def main(sizes=(100, 600, 2000), steps=2000, dtype=np.float64):
+    results = []
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        np.random.seed(0)
+        esn = EchoStateNetwork(8, n, 2, 0.9, 0.3, 0.2, dtype=dtype)
+        inputs = rng.random((steps, 8))
+
+        # проверка совпадения результатов на одинаковых копиях сети
+        a, b = copy.deepcopy(esn), copy.deepcopy(esn)
+        identical = all(np.array_equal(legacy_predict(a, x), b.predict(x)) for x in inputs[:200])
+        identical &= np.array_equal(a.W_out, b.W_out)
+
+        for name, step in (("legacy", legacy_predict), ("inplace", EchoStateNetwork.predict)):
+            latency, peak = measure(step, copy.deepcopy(esn), inputs)
+            results.append({"n_reservoir": n, "impl": name, "latency_us": latency,
+                            "peak_alloc_bytes": peak, "identical": bool(identical)})
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(main(), indent=2))
@@ -0,0 +1,154 @@
+""" набор безоконных бенчмарков: шаг и построение ESN в зависимости от размера резервуара,
+    тики в секунду цикла миссии в зависимости от числа роботов; результат - JSON """
+import argparse, json, os, platform, random, subprocess, sys, time
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1") # баннер pygame в stdout ломает JSON
+
+from esn import Reservoir, EchoStateNetwork, clear_weight_cache
+from fleet_esn import FleetESN
+from missions import mission_circle, mission_circle_hole
+from obstacle import Obstacle
+from obstacle_set import ObstacleSet
+from room import Room
+from simulation import Simulation
+from spatial_index import SpatialGrid, NeighbourList
+import robot_esn, robot_simple
+
+MISSIONS = {"circle": mission_circle, "circle_hole": mission_circle_hole}
+
+
+def timed(f, repeat):
+    """ среднее время вызова f, с """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_esn_step(sizes, steps):
+    """ задержка Reservoir.update_state и EchoStateNetwork.predict (с обучением и в режиме вывода) """
+    results = []
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        np.random.seed(0)
+        esn = EchoStateNetwork(8, n, 2, 0.9, 0.3, 0.2)
+        x = rng.random(8)
+        x_col = x.reshape(-1, 1)
+        result = {"n_reservoir": n,
+                  "update_state_us": timed(lambda: esn.reservoir.update_state(x_col), steps) * 1e6,
+                  "predict_us": timed(lambda: esn.predict(x), steps) * 1e6}
+        esn.freeze()
+        result["predict_frozen_us"] = timed(lambda: esn.predict(x), steps) * 1e6
+        results.append(result)
+    return results
+
+
+def bench_construction(sizes, repeat):
+    """ время построения Reservoir (генерация весов и масштабирование спектрального радиуса) """
+    results = []
+    for n in sizes:
+        for sparse in (False, True):
+            clear_weight_cache()
+            np.random.seed(0)
+            results.append({"n_reservoir": n, "sparse": sparse,
+                            "seconds": timed(lambda: Reservoir(n, 8, 0.9, 0.3, 0.2, sparse=sparse), repeat)})
+    return results
+
+
+def object_loop(data, robot, n_reservoir, ticks, skin=None):
+    """ цикл mission_*.main на объектах Robot без отрисовки; возвращает тики в секунду """
+    random.seed(0)
+    np.random.seed(0)
+    room = Room(data["size"], data["colors"]["room"])
+    obstacles = ObstacleSet([Obstacle(*ob, data["colors"]["obstacle"]) for ob in data["obstacles"]])
+    if robot == "esn":
+        robots = [robot_esn.Robot(*rb, data["rsize"], data["colors"]["robot"], n_reservoir=n_reservoir, seed=0)
+                  for rb in data["robots"]]
+        fleet = FleetESN([rob.esn for rob in robots])
+    else:
+        robots = [robot_simple.Robot(*rb, data["rsize"], data["colors"]["robot"]) for rb in data["robots"]]
+    objects = [room, obstacles] + robots
+    grid = SpatialGrid(2 * data["rsize"], obstacles, robots, [room])
+    if skin is not None:
+        grid = NeighbourList(grid, skin)
+    dt = 1 / data["fps"]
+
+    count = data["fps"]
+    start = time.perf_counter()
+    for _ in range(ticks):
+        if count == 0:
+            if robot == "esn":
+                fleet.update(robots, room, obstacles, grid)
+            else:
+                for rob in robots:
+                    rob.update(room, obstacles, robots)
+        for rob in robots:
+            rob.move(dt, objects, grid)
+        count -= 1
+        if count < 0:
+            count = data["fps"]
+    return ticks / (time.perf_counter() - start)
+
+
+def simulation_loop(data, robot, n_reservoir, ticks, skin=None):
+    """ тот же цикл на векторизованном ядре Simulation; возвращает тики в секунду """
+    sim = Simulation(data, robot, n_reservoir, reservoir_seed=0, seed=0, shared=True, skin=skin)
+    metrics = sim.run(ticks, until_done=False)
+    return ticks / metrics["wall_time"]
+
+
+def bench_missions(counts, n_reservoir, ticks, skin=None):
+    """ тики в секунду цикла миссии в зависимости от числа роботов; skin - запас списков соседей Верле """
+    results = []
+    for mission_name, mission in MISSIONS.items():
+        for robot in ("simple", "esn"):
+            for n in counts:
+                data = mission(n)()
+                for engine, loop in (("objects", object_loop), ("simulation", simulation_loop)):
+                    results.append({"mission": mission_name, "robot": robot, "engine": engine, "robots": n,
+                                    "skin": skin, "ticks_per_second": loop(data, robot, n_reservoir, ticks, skin)})
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"commit": commit or None, "python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="малые размеры для быстрой проверки")
+    parser.add_argument("--output", help="файл для JSON (по умолчанию - stdout)")
+    parser.add_argument("--n-reservoir", type=int, default=600, help="размер резервуара роботов в миссиях")
+    parser.add_argument("--skin", type=float, help="запас списков соседей Верле в миссиях (по умолчанию - без них)")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        sizes, build_sizes, counts, steps, ticks = (100, 300), (100, 300), (5, 20), 200, 120
+    else:
+        sizes, build_sizes, counts, steps, ticks = (100, 300, 600, 1000, 2000), (100, 300, 600, 1000, 2000), \
+            (10, 50, 100, 200), 1000, 600
+
+    report = {
+        "environment": environment(),
+        "esn_step": bench_esn_step(sizes, steps),
+        "reservoir_construction": bench_construction(build_sizes, 1),
+        "mission_loop": bench_missions(counts, args.n_reservoir, ticks, args.skin),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import json, zipfile
+import numpy as np
+
+from esn import Reservoir, EchoStateNetwork, SparseMatrix
+from fleet_esn import FleetESN
+
+# Чекпоинт - несжатый .npz: каждый массив хранится в архиве как .npy без сжатия,
+# поэтому его можно отобразить в память (np.memmap) прямо из архива, не читая в RAM.
+# Параметры сети (размеры, leaking_rate, seed, ...) хранятся в массиве "meta" как JSON-строка.
+
+WRITABLE = ("W_out", "state") # обучаемые массивы открываются в режиме копирования при записи
+
+
+def _cast(a, dtype):
+    return a if dtype is None else np.asarray(a, dtype=dtype)
+
+
+def _seed(seed):
+    return None if seed is None else int(seed)
+
+
+def _save(path, meta, arrays, dtype):
+    arrays = {name: _cast(a, dtype) if a.dtype.kind == "f" else a for name, a in arrays.items()}
+    np.savez(path, meta=np.array(json.dumps(meta)), **arrays)
+
+
+def _read_header(f):
+    """ заголовок .npy: форма, порядок и тип; файл остаётся на начале данных """
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    return np.lib.format.read_array_header_2_0(f)
+
+
+def _load(path, mmap=True, writable=WRITABLE):
+    """ массивы чекпоинта; при mmap=True - отображения в память без копирования,
+        writable - массивы, открываемые в режиме копирования при записи (остальные - только для чтения) """
+    if not mmap:
+        with np.load(path) as f:
+            arrays = {name: f[name] for name in f.files}
+        return json.loads(str(arrays.pop("meta"))), arrays
+
+    arrays = {}
+    with zipfile.ZipFile(path) as z, open(path, "rb") as f:
+        for info in z.infolist():
+            name = info.filename[:-len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: массив {name} сжат и не может быть отображён в память")
+            # локальный заголовок zip: 30 байт + имя + дополнительное поле
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+            start = info.header_offset + 30 + int(name_len) + int(extra_len)
+            f.seek(start)
+            shape, fortran, dtype = _read_header(f)
+            if dtype.kind == "U":
+                """ строка метаданных читается целиком """
+                f.seek(start)
+                arrays[name] = np.lib.format.read_array(f)
+                continue
+            mode = "c" if name in writable else "r"
+            arrays[name] = np.memmap(path, dtype=dtype, mode=mode, offset=f.tell(), shape=shape,
+                                     order="F" if fortran else "C")
+    return json.loads(str(arrays.pop("meta"))), arrays
+
+
+def _W_arrays(W):
+    """ массивы для хранения W: плотная матрица или части CSR """
+    if isinstance(W, SparseMatrix):
+        return {"W_data": W.data, "W_indices": W.indices, "W_indptr": W.indptr}
+    return {"W": W}
+
+
+def _W_from(a, n):
+    if "W_data" in a:
+        return SparseMatrix(a["W_data"], a["W_indices"], a["W_indptr"], (n, n))
+    return a["W"]
+
+
+def save_network(path, esn, dtype=None):
+    """ сохранение сети в один .npz; dtype=np.float32 - компактное хранение весов """
+    res = esn.reservoir
+    meta = {"kind": "network", "leaking_rate": res.leaking_rate, "seed": _seed(res.seed),
+            "max_vel": esn.max_vel, "learning_rate": esn.learning_rate}
+    arrays = {"W_in": res.W_in, "W_out": esn.W_out, "state": res.state[:, 0], **_W_arrays(res.W)}
+    _save(path, meta, arrays, dtype)
+
+
+def load_network(path, mmap=True, frozen=False):
+    """ загрузка сети; при mmap=True веса не копируются в память;
+        frozen=True - сеть только для вывода, W_out отображается только для чтения """
+    meta, a = _load(path, mmap, ("state",) if frozen else WRITABLE)
+    W = _W_from(a, a["W_in"].shape[0])
+    res = Reservoir.from_weights(a["W_in"], W, meta["leaking_rate"], meta["seed"], a["state"])
+    return EchoStateNetwork.from_weights(res, a["W_out"], meta["max_vel"], meta["learning_rate"], frozen)
+
+
+def save_fleet(path, fleet, robots=None, dtype=None):
+    """ сохранение флота (веса всех сетей; общий резервуар - один раз) и,
+        если заданы, положений, целей и скоростей роботов """
+    meta = {"kind": "fleet",
+            "shared": fleet.shared,
+            "leaking_rate": fleet.leaking_rate[:, 0].tolist(),
+            "learning_rate": fleet.learning_rate.tolist(),
+            "max_vel": fleet.max_vel[:, 0].tolist(),
+            "seed": [_seed(esn.reservoir.seed) for esn in fleet.networks]}
+    arrays = {"W_in": fleet.W_in, "W_out": fleet.W_out, "state": fleet.state, **_W_arrays(fleet.W)}
+    if robots is not None:
+        arrays.update(pos=np.array([rob.pos for rob in robots], dtype=float),
+                      target=np.array([rob.target for rob in robots], dtype=float),
+                      vel=np.array([rob.vel for rob in robots], dtype=float))
+    _save(path, meta, arrays, dtype)
+
+
+def load_fleet(path, mmap=True, frozen=False):
+    """ загрузка флота; возвращает FleetESN и словарь с pos/target/vel роботов (или None);
+        frozen=True - флот только для вывода (FleetESN.freeze), W_out отображается только для чтения """
+    meta, a = _load(path, mmap, ("state",) if frozen else WRITABLE)
+    W_in = a["W_in"]
+    W = _W_from(a, W_in.shape[-2])
+    networks = []
+    for i in range(len(a["W_out"])):
+        if meta["shared"]:
+            res = Reservoir.from_weights(W_in, W, meta["leaking_rate"][i], meta["seed"][i])
+        else:
+            res = Reservoir.from_weights(W_in[i], W[i], meta["leaking_rate"][i], meta["seed"][i])
+        networks.append(EchoStateNetwork.from_weights(res, a["W_out"][i], meta["max_vel"][i], meta["learning_rate"][i],
+                                                      frozen))
+    fleet = FleetESN.from_arrays(networks, W_in, W, a["W_out"], a["state"])
+    robots = {name: a[name] for name in ("pos", "target", "vel") if name in a} or None
+    return fleet, robots
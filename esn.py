@@ -1,109 +1,379 @@
-import numpy as np
-
-class Reservoir:
-    def __init__(self, n_reservoir, n_inputs, spectral_radius=0.9, sparsity=0.1, leaking_rate=0.6):
-        self.n_reservoir = n_reservoir
-        self.n_inputs = n_inputs
-        self.leaking_rate = leaking_rate
-
-        self.W_in = np.random.uniform(-1, 1, (n_reservoir, n_inputs + 1))
-        self.W = np.random.uniform(-1, 1, (n_reservoir, n_reservoir))
-        
-        mask = np.random.rand(*self.W.shape) > sparsity
-        self.W[mask] = 0
-        
-        eigvals = np.linalg.eigvals(self.W)
-        self.W *= spectral_radius / np.max(np.abs(eigvals))
-
-        self.state = np.zeros((n_reservoir, 1)) * 0.01
-
-    def update_state(self, input_vector):
-        """Обновление состояния резервуара"""
-        input_vector_with_bias = np.vstack((np.array([[1]]), input_vector))
-        pre_activation = np.dot(self.W, self.state) + np.dot(self.W_in, input_vector_with_bias)
-        updated = np.tanh(pre_activation)
-        self.state = (1 - self.leaking_rate) * self.state + self.leaking_rate * updated
-        return self.state.flatten()
-
-
-class EchoStateNetwork:
-    def __init__(self, n_inputs, n_reservoir, n_outputs, spectral_radius=0.9, sparsity=0.3, leaking_rate=0.6):
-        self.n_inputs = n_inputs
-        self.n_reservoir = n_reservoir
-        self.n_outputs = n_outputs
-        self.reservoir = Reservoir(n_reservoir, n_inputs, spectral_radius, sparsity, leaking_rate)
-        self.W_out = np.random.randn(n_outputs, n_reservoir + 1) * 0.1
-        self.max_vel = 200.0 # Максимальная скорость для нормализации
-        self.last_distance_to_target = 0
-
-
-    def reward_function(self, input_vector):
-        """Функция награды"""
-        pos = np.array(input_vector[0:2])
-        target = np.array(input_vector[2:4])
-        vel = np.array(input_vector[4:6])
-        nearest = np.array(input_vector[6:8])
-
-        current_distance = np.linalg.norm(pos - target)
-        delta = 0
-
-        self.last_distance_to_target = current_distance
-
-        if self.last_distance_to_target is not None:
-            delta = self.last_distance_to_target - current_distance
-
-        reward = 0
-
-        # Штраф за то, что расстояние до цели почти не изменилось
-        if abs(delta) < 0.1:
-            reward -= 20
-
-        # Штраф за расстояние
-        reward += delta * 100  # поощрение за приближение
-        reward -= 0.01 * current_distance  # штраф за удаленность
-
-        # Штраф за близость к препятствию
-        distance_to_obstacle = np.linalg.norm(pos - nearest)
-        if distance_to_obstacle < 10:
-            reward -= (10 - distance_to_obstacle) * 50
-
-        # Бонус за достижение цели
-        if current_distance < 5:
-            reward += 500
-            if np.linalg.norm(vel) > 10:
-                reward -= 30  # штраф за высокую скорость у цели
-
-        robot_velocity = np.linalg.norm([vel[0], vel[1]])
-        reward += robot_velocity * 20  # Поощрение за движение
-
-        return reward
-
-
-    def predict(self, input_vector):
-        """Предсказание с обработкой столкновений"""
-    
-        state = self.reservoir.update_state(input_vector.reshape(-1, 1))
-        state_with_bias = np.concatenate([[1], state])
-        
-        prediction = np.dot(self.W_out, state_with_bias)
-
-        if np.linalg.norm(prediction) > 1:
-            prediction = prediction / np.linalg.norm(prediction)
-
-        direction = np.array([
-            input_vector[2] - input_vector[0],  
-            input_vector[3] - input_vector[1]
-        ])
-
-        direction = direction / (np.linalg.norm(direction) + 1e-6)
-
-        error = prediction - direction
-        reward = self.reward_function(input_vector)
-        scaled_reward = np.tanh(reward / 100.0)
-
-        lr = 0.1
-        gradient = 2 * error[:, np.newaxis] * state_with_bias
-        self.W_out -= lr * scaled_reward * gradient
-
-        return prediction * self.max_vel
-        
\ No newline at end of file
+import math
+import numpy as np
+
+class SparseMatrix:
+    """ разреженная матрица в формате CSR: значения, индексы столбцов и указатели начала строк """
+    def __init__(self, data, indices, indptr, shape):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = shape
+        self._starts = indptr[:-1][np.diff(indptr) > 0]
+        self._nonempty = np.diff(indptr) > 0
+        self._full = bool(self._nonempty.all())
+
+    @classmethod
+    def random(cls, n, density, rng=np.random):
+        """ случайная матрица n x n, в каждой строке ровно round(density * n) ненулевых элементов из U(-1, 1) """
+        k = int(round(density * n))
+        chunk = max(1, 4_000_000 // n) # строки генерируются блоками, чтобы не создавать n x n случайных чисел
+        indices = np.empty((n, k), dtype=np.int32)
+        if k > 0:
+            for start in range(0, n, chunk):
+                stop = min(start + chunk, n)
+                cols = np.argpartition(rng.random((stop - start, n)), k - 1, axis=1)[:, :k]
+                indices[start:stop] = np.sort(cols, axis=1)
+        data = rng.uniform(-1, 1, n * k)
+        indptr = np.arange(n + 1, dtype=np.int64) * k
+        return cls(data, indices.reshape(-1), indptr, (n, n))
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def astype(self, dtype):
+        return SparseMatrix(self.data.astype(dtype), self.indices, self.indptr, self.shape)
+
+    def __imul__(self, c):
+        self.data *= c
+        return self
+
+    def dot(self, x, out=None):
+        """ произведение матрицы на вектор или матрицу x; стоимость пропорциональна числу ненулевых элементов.
+            out - массив для результата (временный массив произведений размера nnz всё равно создаётся) """
+        products = self.data.reshape((-1,) + (1,) * (x.ndim - 1)) * x[self.indices]
+        if out is None:
+            out = np.empty((self.shape[0],) + x.shape[1:], dtype=np.result_type(self.data, x))
+        if self._full:
+            np.add.reduceat(products, self._starts, axis=0, out=out)
+        else:
+            out[...] = 0
+            if len(self._starts):
+                out[self._nonempty] = np.add.reduceat(products, self._starts, axis=0)
+        return out
+
+    __matmul__ = dot
+
+    def toarray(self):
+        """ плотное представление матрицы """
+        W = np.zeros(self.shape, dtype=self.data.dtype)
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        W[rows, self.indices] = self.data
+        return W
+
+
+_weight_cache = {}
+
+def clear_weight_cache():
+    """ очистка кэша масштабированных весов резервуаров """
+    _weight_cache.clear()
+
+
+def spectral_radius(W, tol=1e-3, max_iter=300, exact_below=256, check_every=10):
+    """ спектральный радиус W: точно через eigvals для малых матриц, иначе оценка методом Арнольди
+        (итерации останавливаются, когда невязка старшей пары Ритца меньше tol * |lambda|) """
+    n = W.shape[0]
+    if n < exact_below:
+        dense = W.toarray() if isinstance(W, SparseMatrix) else W
+        return np.max(np.abs(np.linalg.eigvals(dense)))
+
+    m = min(max_iter, n)
+    Q = np.zeros((n, m + 1))
+    H = np.zeros((m + 1, m))
+    # отдельный генератор, чтобы не сдвигать глобальный поток np.random
+    q = np.random.default_rng(0).standard_normal(n)
+    Q[:, 0] = q / np.linalg.norm(q)
+
+    radius = 0.0
+    for j in range(m):
+        v = W.dot(Q[:, j])
+        for _ in range(2): # повторная ортогонализация Грама-Шмидта
+            h = Q[:, :j + 1].T @ v
+            v -= Q[:, :j + 1] @ h
+            H[:j + 1, j] += h
+        H[j + 1, j] = np.linalg.norm(v)
+        breakdown = H[j + 1, j] < 1e-12
+
+        if breakdown or (j + 1) % check_every == 0 or j == m - 1:
+            vals, vecs = np.linalg.eig(H[:j + 1, :j + 1])
+            i = np.argmax(np.abs(vals))
+            radius = np.abs(vals[i])
+            if breakdown or H[j + 1, j] * np.abs(vecs[-1, i]) <= tol * radius:
+                break
+        Q[:, j + 1] = v / H[j + 1, j]
+    return radius
+
+
+def _freeze(W):
+    """ общие (кэшированные) веса доступны только для чтения """
+    data = W.data if isinstance(W, SparseMatrix) else W
+    data.setflags(write=False)
+
+
+class Reservoir:
+    def __init__(self, n_reservoir, n_inputs, spectral_radius=0.9, sparsity=0.1, leaking_rate=0.6, sparse=False,
+                 seed=None, radius_tol=1e-3, exact_below=256, dtype=np.float64):
+        """ sparsity - доля ненулевых весов W; sparse=True хранит W в формате CSR;
+            резервуары с одинаковым seed (и параметрами) используют одни и те же масштабированные веса;
+            dtype - тип весов и состояния (np.float32 - вдвое меньше памяти) """
+        self.n_reservoir = n_reservoir
+        self.n_inputs = n_inputs
+        self.leaking_rate = leaking_rate
+        self.seed = seed
+        self.dtype = np.dtype(dtype)
+
+        key = (n_reservoir, n_inputs, spectral_radius, sparsity, sparse, seed, radius_tol, exact_below, self.dtype)
+        if seed is not None and key in _weight_cache:
+            self.W_in, self.W = _weight_cache[key]
+        else:
+            self.W_in, self.W = self._build_weights(spectral_radius, sparsity, sparse, seed, radius_tol, exact_below)
+            if seed is not None:
+                _freeze(self.W_in)
+                _freeze(self.W)
+                _weight_cache[key] = (self.W_in, self.W)
+
+        self.state = np.zeros((n_reservoir, 1), dtype=self.dtype) * 0.01
+        self._alloc_buffers()
+
+    def _alloc_buffers(self):
+        """ постоянные буферы шага: вход со смещением и два произведения матриц на вектор """
+        self._input_with_bias = np.ones((self.n_inputs + 1, 1), dtype=self.dtype)
+        self._pre_activation = np.empty((self.n_reservoir, 1), dtype=self.dtype)
+        self._input_term = np.empty((self.n_reservoir, 1), dtype=self.dtype)
+
+    @classmethod
+    def from_weights(cls, W_in, W, leaking_rate, seed=None, state=None):
+        """ резервуар из готовых весов (без генерации и масштабирования), например из чекпоинта """
+        res = cls.__new__(cls)
+        res.n_reservoir = W_in.shape[0]
+        res.n_inputs = W_in.shape[1] - 1
+        res.leaking_rate = leaking_rate
+        res.seed = seed
+        res.dtype = W_in.dtype
+        res.W_in = W_in
+        res.W = W
+        res.state = np.zeros((res.n_reservoir, 1), dtype=res.dtype) if state is None else state.reshape(-1, 1)
+        res._alloc_buffers()
+        return res
+
+    def clone(self):
+        """ резервуар с теми же весами (общими и неизменяемыми) и собственным нулевым состоянием """
+        _freeze(self.W_in)
+        _freeze(self.W)
+        return Reservoir.from_weights(self.W_in, self.W, self.leaking_rate, self.seed)
+
+    def _build_weights(self, radius, sparsity, sparse, seed, tol, exact_below):
+        """ генерация W_in и W, масштабирование W до заданного спектрального радиуса """
+        rng = np.random if seed is None else np.random.default_rng(seed)
+        n = self.n_reservoir
+
+        W_in = rng.uniform(-1, 1, (n, self.n_inputs + 1))
+        if sparse:
+            W = SparseMatrix.random(n, sparsity, rng)
+        else:
+            W = rng.uniform(-1, 1, (n, n))
+
+            mask = rng.random(W.shape) > sparsity
+            W[mask] = 0
+
+        W *= radius / spectral_radius(W, tol, exact_below=exact_below)
+        # веса генерируются и масштабируются в float64, затем приводятся к рабочему типу
+        return W_in.astype(self.dtype), W.astype(self.dtype)
+
+    def update_state(self, input_vector):
+        """Обновление состояния резервуара (на месте, без выделения памяти); возвращает вид на состояние"""
+        self._input_with_bias[1:, 0] = input_vector.reshape(-1)
+        pre_activation = self._pre_activation
+        self.W.dot(self.state, out=pre_activation)
+        np.dot(self.W_in, self._input_with_bias, out=self._input_term)
+        pre_activation += self._input_term
+        updated = np.tanh(pre_activation, out=pre_activation)
+        # state = (1 - a) * state + a * updated
+        self.state *= 1 - self.leaking_rate
+        updated *= self.leaking_rate
+        self.state += updated
+        return self.state[:, 0]
+
+
+def batch_reward(inputs):
+    """ награды (N,) для матрицы признаков inputs (N, 8) за один проход, как EchoStateNetwork.reward_function.
+        Как и там, изменение расстояния до цели delta всегда нулевое (прежнее расстояние перезаписывается
+        текущим до сравнения), поэтому штраф -20 за "стояние на месте" начисляется всегда """
+    x = np.asarray(inputs, dtype=np.float64).reshape(-1, 8)
+    current_distance = np.sqrt((x[:, 0] - x[:, 2]) ** 2 + (x[:, 1] - x[:, 3]) ** 2)
+    distance_to_obstacle = np.sqrt((x[:, 0] - x[:, 6]) ** 2 + (x[:, 1] - x[:, 7]) ** 2)
+    robot_velocity = np.sqrt(x[:, 4] ** 2 + x[:, 5] ** 2)
+
+    reward = -20.0 - 0.01 * current_distance
+    reward -= np.where(distance_to_obstacle < 10, (10 - distance_to_obstacle) * 50, 0.0)
+    at_target = current_distance < 5
+    reward += np.where(at_target, 500.0, 0.0)
+    reward -= np.where(at_target & (robot_velocity > 10), 30.0, 0.0)
+    reward += robot_velocity * 20
+    return reward
+
+
+class EchoStateNetwork:
+    def __init__(self, n_inputs, n_reservoir, n_outputs, spectral_radius=0.9, sparsity=0.3, leaking_rate=0.6, sparse=False,
+                 seed=None, reservoir=None, dtype=np.float64):
+        """ reservoir - общий резервуар: сеть использует его веса, но хранит собственное состояние;
+            dtype - тип весов, состояния и вычислений (у общего резервуара - его собственный) """
+        self.n_inputs = n_inputs
+        self.n_reservoir = n_reservoir
+        self.n_outputs = n_outputs
+        if reservoir is None:
+            self.reservoir = Reservoir(n_reservoir, n_inputs, spectral_radius, sparsity, leaking_rate, sparse, seed,
+                                       dtype=dtype)
+        else:
+            if (reservoir.n_inputs, reservoir.n_reservoir) != (n_inputs, n_reservoir):
+                raise ValueError("размеры общего резервуара не совпадают с размерами сети")
+            self.reservoir = reservoir.clone()
+        self.dtype = self.reservoir.dtype
+        self.W_out = (np.random.randn(n_outputs, n_reservoir + 1) * 0.1).astype(self.dtype)
+        self.max_vel = 200.0 # Максимальная скорость для нормализации
+        self.learning_rate = 0.1
+        self.frozen = False # True - только вывод: predict не считает награду и не обучает W_out
+        self.last_distance_to_target = 0
+        self._alloc_buffers()
+
+    def _alloc_buffers(self):
+        """ постоянные буферы predict: состояние со смещением, выход, направление, ошибка и градиент """
+        self._state_with_bias = np.ones(self.n_reservoir + 1, dtype=self.dtype)
+        self._prediction = np.empty(self.n_outputs, dtype=self.dtype)
+        self._direction = np.empty(2, dtype=self.dtype)
+        self._error = np.empty(self.n_outputs, dtype=self.dtype)
+        self._gradient = np.empty((self.n_outputs, self.n_reservoir + 1), dtype=self.dtype)
+
+    @classmethod
+    def from_weights(cls, reservoir, W_out, max_vel=200.0, learning_rate=0.1, frozen=False):
+        """ сеть из готового резервуара и выходного слоя, например из чекпоинта;
+            frozen=True - обученная сеть только для вывода (см. freeze) """
+        esn = cls.__new__(cls)
+        esn.n_inputs = reservoir.n_inputs
+        esn.n_reservoir = reservoir.n_reservoir
+        esn.n_outputs = W_out.shape[0]
+        esn.reservoir = reservoir
+        esn.dtype = reservoir.dtype
+        esn.W_out = W_out
+        esn.max_vel = max_vel
+        esn.learning_rate = learning_rate
+        esn.frozen = frozen
+        esn.last_distance_to_target = 0
+        esn._alloc_buffers()
+        return esn
+
+
+    def reward_function(self, input_vector):
+        """Функция награды (та же, что batch_reward, для одного вектора признаков)"""
+        px, py, tx, ty, vx, vy, nx, ny = (float(v) for v in input_vector[:8])
+
+        dx, dy = px - tx, py - ty
+        current_distance = math.sqrt(dx * dx + dy * dy)
+        delta = 0
+
+        self.last_distance_to_target = current_distance
+
+        if self.last_distance_to_target is not None:
+            delta = self.last_distance_to_target - current_distance
+
+        reward = 0
+
+        # Штраф за то, что расстояние до цели почти не изменилось
+        if abs(delta) < 0.1:
+            reward -= 20
+
+        # Штраф за расстояние
+        reward += delta * 100  # поощрение за приближение
+        reward -= 0.01 * current_distance  # штраф за удаленность
+
+        # Штраф за близость к препятствию
+        dx, dy = px - nx, py - ny
+        distance_to_obstacle = math.sqrt(dx * dx + dy * dy)
+        if distance_to_obstacle < 10:
+            reward -= (10 - distance_to_obstacle) * 50
+
+        robot_velocity = math.sqrt(vx * vx + vy * vy)
+
+        # Бонус за достижение цели
+        if current_distance < 5:
+            reward += 500
+            if robot_velocity > 10:
+                reward -= 30  # штраф за высокую скорость у цели
+
+        reward += robot_velocity * 20  # Поощрение за движение
+
+        return reward
+
+
+    def freeze(self, frozen=True):
+        """ режим вывода: W_out не меняется, награда не считается - шаг стоит как обновление резервуара """
+        self.frozen = frozen
+        return self
+
+    def predict(self, input_vector):
+        """Предсказание с обработкой столкновений (шаг и обновление W_out - в постоянных буферах)"""
+    
+        input_vector = np.asarray(input_vector, dtype=self.dtype)
+        state = self.reservoir.update_state(input_vector)
+        state_with_bias = self._state_with_bias
+        state_with_bias[1:] = state
+        
+        prediction = np.dot(self.W_out, state_with_bias, out=self._prediction)
+
+        length = np.linalg.norm(prediction)
+        if length > 1:
+            prediction /= length
+
+        if self.frozen:
+            return prediction * self.max_vel
+
+        direction = self._direction
+        direction[0] = input_vector[2] - input_vector[0]
+        direction[1] = input_vector[3] - input_vector[1]
+
+        direction /= np.linalg.norm(direction) + 1e-6
+
+        error = np.subtract(prediction, direction, out=self._error)
+        reward = self.reward_function(input_vector)
+        scaled_reward = self.dtype.type(np.tanh(reward / 100.0))
+
+        # W_out -= lr * r * (2 * error) ⊗ state_with_bias - обновление ранга 1 на месте
+        error *= 2
+        gradient = np.multiply(error[:, np.newaxis], state_with_bias, out=self._gradient)
+        gradient *= self.learning_rate * scaled_reward
+        self.W_out -= gradient
+
+        return prediction * self.max_vel
+
+
+class RidgeReadout:
+    """ обучение выходного слоя гребневой регрессией: X^T X и X^T Y накапливаются по мере поступления
+        данных, поэтому память O(n^2) не зависит от длины траекторий """
+    def __init__(self, n_features, n_outputs):
+        self.XtX = np.zeros((n_features, n_features))
+        self.XtY = np.zeros((n_features, n_outputs))
+        self.count = 0
+
+    def add(self, X, Y):
+        """ X - состояния со смещением (T, n + 1), Y - целевые выходы (T, k) """
+        X = np.asarray(X, dtype=np.float64)
+        Y = np.asarray(Y, dtype=np.float64)
+        self.XtX += X.T @ X
+        self.XtY += X.T @ Y
+        self.count += len(X)
+
+    def merge(self, other):
+        """ объединение накопителей (например, собранных в разных процессах) """
+        self.XtX += other.XtX
+        self.XtY += other.XtY
+        self.count += other.count
+        return self
+
+    def solve(self, ridge=1e-4):
+        """ W_out (k, n + 1) = ((X^T X + ridge I)^-1 X^T Y)^T """
+        A = self.XtX + ridge * np.eye(len(self.XtX))
+        return np.linalg.solve(A, self.XtY).T
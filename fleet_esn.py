@@ -0,0 +1,166 @@
+import numpy as np
+from esn import SparseMatrix, batch_reward
+from profiling import profiler
+
+
+def _dense(W):
+    """ плотная копия весов резервуара (пакетный движок работает с плотными 3-D массивами) """
+    return W.toarray() if isinstance(W, SparseMatrix) else W
+
+
+class FleetESN:
+    """ пакетный движок ESN: состояния, W_in, W и W_out N роботов в 3-D массивах """
+    def __init__(self, networks):
+        self.networks = list(networks)
+        first = self.networks[0]
+        for esn in self.networks:
+            if (esn.n_inputs, esn.n_reservoir, esn.n_outputs) != (first.n_inputs, first.n_reservoir, first.n_outputs):
+                raise ValueError("все сети флота должны иметь одинаковые размеры")
+
+        reservoirs = [esn.reservoir for esn in self.networks]
+        shared = all(res.W is reservoirs[0].W and res.W_in is reservoirs[0].W_in for res in reservoirs)
+        if shared:
+            """ общий резервуар: одна матрица W (n, n) и W_in (n, m + 1) на весь флот """
+            W_in, W = reservoirs[0].W_in, reservoirs[0].W
+        else:
+            W_in = np.stack([res.W_in for res in reservoirs])                # (N, n, m + 1)
+            W = np.stack([_dense(res.W) for res in reservoirs])              # (N, n, n)
+        self._setup(W_in, W,
+                    np.stack([esn.W_out for esn in self.networks]),          # (N, k, n + 1)
+                    np.stack([res.state[:, 0] for res in reservoirs]))       # (N, n)
+
+    @classmethod
+    def from_arrays(cls, networks, W_in, W, W_out, state):
+        """ флот из готовых массивов без копирования (например, отображённых в память);
+            W_in (n, m + 1) и W (n, n) без оси роботов означают общий резервуар """
+        fleet = cls.__new__(cls)
+        fleet.networks = list(networks)
+        fleet._setup(W_in, W, W_out, state)
+        return fleet
+
+    def _setup(self, W_in, W, W_out, state):
+        self.n_robots = len(self.networks)
+        self.shared = W_in.ndim == 2
+        self.n_inputs = W_in.shape[-1] - 1
+        self.n_reservoir = W_in.shape[-2]
+        self.n_outputs = W_out.shape[1]
+
+        self.W_in = W_in
+        self.W = W
+        self.W_out = W_out
+        self.state = state
+        self.dtype = W_out.dtype # все вычисления - в типе весов, без скрытого повышения точности
+        self.leaking_rate = np.array([esn.reservoir.leaking_rate for esn in self.networks], dtype=self.dtype)[:, np.newaxis]
+        self.learning_rate = np.array([esn.learning_rate for esn in self.networks], dtype=self.dtype)
+        self.max_vel = np.array([esn.max_vel for esn in self.networks], dtype=self.dtype)[:, np.newaxis]
+        self.reward = np.zeros(self.n_robots) # награды последнего шага predict
+        self.frozen = all(esn.frozen for esn in self.networks)
+
+        self._bind()
+
+    def _bind(self):
+        """ веса отдельных сетей становятся видами (views) на общие массивы флота """
+        for i, esn in enumerate(self.networks):
+            if not self.shared:
+                esn.reservoir.W_in = self.W_in[i]
+                esn.reservoir.W = self.W[i]
+            esn.reservoir.state = self.state[i][:, np.newaxis]
+            esn.W_out = self.W_out[i]
+
+    def advance(self, inputs, active=None):
+        """ шаг резервуаров для матрицы признаков inputs (N, m) без обучения; считаются и меняются только
+            состояния active роботов, поэтому стоимость шага пропорциональна их числу.
+            Возвращает состояния всех роботов (N, n) (у неактивных - прежние) """
+        with profiler.phase("esn_step"):
+            return self._advance(np.asarray(inputs, dtype=self.dtype), active)
+
+    def _advance(self, inputs, active):
+        if active is None or np.all(active):
+            idx = slice(None)
+        else:
+            idx = np.flatnonzero(active)
+            inputs = inputs[idx]
+
+        state = self.state[idx]
+        ones = np.ones((len(state), 1), dtype=self.dtype)
+        inputs_with_bias = np.concatenate([ones, inputs], axis=1)
+        if self.shared:
+            """ все роботы продвигаются одним произведением матриц W @ States """
+            pre_activation = (self.W @ state.T).T + inputs_with_bias @ self.W_in.T
+        elif isinstance(idx, slice):
+            pre_activation = (np.matmul(self.W, state[:, :, np.newaxis])
+                              + np.matmul(self.W_in, inputs_with_bias[:, :, np.newaxis]))[:, :, 0]
+        else:
+            """ W[idx] скопировал бы веса активных роботов (N n^2) - считаем по видам на веса каждого """
+            pre_activation = np.empty_like(state)
+            for k, i in enumerate(idx):
+                pre_activation[k] = self.W[i] @ state[k] + self.W_in[i] @ inputs_with_bias[k]
+        updated = np.tanh(pre_activation)
+        leaking_rate = self.leaking_rate[idx]
+        self.state[idx] = (1 - leaking_rate) * state + leaking_rate * updated
+        return self.state
+
+    def freeze(self, frozen=True):
+        """ режим вывода для всего флота (см. EchoStateNetwork.freeze): predict не считает награды
+            и не обучает W_out, шаг стоит как продвижение резервуаров """
+        self.frozen = frozen
+        for esn in self.networks:
+            esn.frozen = frozen
+        return self
+
+    def predict(self, inputs, active=None):
+        """ пакетное предсказание для матрицы признаков inputs (N, m); считаются и обучаются только active роботы,
+            у остальных предсказание нулевое. У замороженного флота (freeze) обучения нет, награды нулевые """
+        inputs = np.asarray(inputs, dtype=self.dtype)
+        n = self.n_robots
+        if active is None:
+            active = np.ones(n, dtype=bool)
+        idx = np.flatnonzero(active)
+
+        state = self.advance(inputs, active)[idx]
+        inputs = inputs[idx]
+        ones = np.ones((len(idx), 1), dtype=self.dtype)
+        state_with_bias = np.concatenate([ones, state], axis=1)
+        prediction = np.matmul(self.W_out[idx], state_with_bias[:, :, np.newaxis])[:, :, 0]
+
+        length = np.linalg.norm(prediction, axis=1, keepdims=True)
+        prediction = np.where(length > 1, prediction / np.where(length > 1, length, 1), prediction)
+
+        result = np.zeros((n, self.n_outputs), dtype=self.dtype)
+        result[idx] = prediction * self.max_vel[idx]
+        if self.frozen:
+            return result
+
+        direction = inputs[:, 2:4] - inputs[:, 0:2]
+        direction = direction / (np.linalg.norm(direction, axis=1, keepdims=True) + 1e-6)
+
+        with profiler.phase("readout"):
+            error = prediction - direction
+            reward = batch_reward(inputs)
+            self.reward = np.zeros(n)
+            self.reward[idx] = reward
+            scaled_reward = np.tanh(reward / 100.0).astype(self.dtype)
+
+            gradient = 2 * error[:, :, np.newaxis] * state_with_bias[:, np.newaxis, :]
+            self.W_out[idx] -= (self.learning_rate[idx] * scaled_reward)[:, np.newaxis, np.newaxis] * gradient
+        return result
+
+    def update(self, robots, room, obstacles, grid=None, due=None):
+        """ обновление скоростей роботов одним пакетным шагом ESN; due - флаги роботов,
+            которым положен шаг управления на этом тике (см. scheduler.ControlScheduler), по умолчанию - все """
+        inputs = np.zeros((self.n_robots, self.n_inputs), dtype=self.dtype)
+        active = np.zeros(self.n_robots, dtype=bool)
+        for i in range(self.n_robots) if due is None else np.flatnonzero(due):
+            rob = robots[i]
+            feat = rob.features(room, obstacles, robots, grid)
+            if feat is None:
+                """ цель достигнута """
+                rob.vel = (0, 0)
+                continue
+            inputs[i] = feat
+            active[i] = True
+        if not active.any():
+            return
+        pred = self.predict(inputs, active)
+        for i in np.flatnonzero(active):
+            robots[i].apply_prediction(pred[i])
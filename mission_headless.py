@@ -0,0 +1,43 @@
+from simulation import Simulation
+from scenarios import load_mission
+from recorder import Recorder
+from profiling import profiler
+from scheduler import ControlScheduler
+from missions import mission_circle, mission_circle_hole
+
+
+def main(mission, robot="simple", max_steps=None, render=False, record=None, profile=None,
+         control_period=None, stagger=False, speed=1.0, ccd=False, frozen=False, skin=None):
+    """ запуск миссии на безоконном ядре; render=True - с отрисовкой в pygame (симуляция в отдельном потоке
+        с фиксированным шагом, speed - во сколько раз быстрее реального времени, None - без ограничения),
+        record - каталог для записи траекторий (см. recorder.py; с render=True пишется из потока симуляции),
+        profile - период (с) печати сводки замеров по фазам (см. profiling.py),
+        control_period - период управления в тиках (по умолчанию fps + 1), stagger - распределить шаги
+        управления роботов по тикам (см. scheduler.py), ccd - непрерывная проверка столкновений,
+        frozen - роботы с ESN без обучения (режим вывода), skin - запас списков соседей Верле
+        (пары роботов проверяются по спискам, в метриках - частота их перестроения) """
+    if profile is not None:
+        profiler.enable(every=profile)
+    data = load_mission(mission)
+    scheduler = None
+    if control_period is not None or stagger:
+        scheduler = ControlScheduler.uniform(len(data["robots"]), control_period or data["fps"] + 1, stagger)
+    sim = Simulation(data, robot, scheduler=scheduler, ccd=ccd, frozen=frozen, skin=skin)
+
+    if not render:
+        if record is None:
+            return sim.run(max_steps)
+        with Recorder(record, data) as recorder:
+            return sim.run(max_steps, on_tick=recorder.record)
+
+    from renderer import run_async
+    if record is None:
+        return run_async(sim, max_steps, speed)
+    with Recorder(record, data) as recorder:
+        return run_async(sim, max_steps, speed, on_tick=recorder.record)
+
+
+if __name__ == "__main__":
+    print(main(mission_circle(10), "simple", max_steps=3000))
+    #print(main(mission_circle_hole(10), "esn", max_steps=3000))
+    #main(mission_circle(10), "esn", render=True)
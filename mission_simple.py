@@ -1,80 +1,84 @@
-import pygame, json
-from sys import exit
-
-from room import Room
-from robot_simple import Robot
-from obstacle import Obstacle
-from missions import mission_circle, mission_circle_hole
-
-def main(mission):
-    pygame.init()
-
-    if type(mission) == str:
-        """ загрузка миссии из файла """
-        with open(f"{mission}.json", encoding="utf-8") as f:
-            data = json.load(f)
-    else:
-        data = mission() 
-
-    screen = pygame.display.set_mode(data["size"])
-    clock = pygame.time.Clock()
-    dt = 1 / data["fps"]
-    font = pygame.font.SysFont('Arial', 18)
-
-    room = Room(data["size"], data["colors"]["room"])
-
-    obstacles = []
-    for ob in data["obstacles"]:
-        obstacles.append(Obstacle(*ob, data["colors"]["obstacle"]))
-
-    robots = []
-    for rb in data["robots"]:
-        robots.append(Robot(*rb, data["rsize"], data["colors"]["robot"]))
-
-    objects = [room] + obstacles + robots
-
-    count = data['fps']
-    start_ticks = pygame.time.get_ticks()
-    goals_reached = 0
-
-    while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-
-        if count == 0:
-            """ обновляем скорость (управление) раз в секунду (один раз в fps тиков) """
-            for rob in robots:
-                rob.update(room, obstacles, robots)
-
-        """ обновляем положение fps на каждом тике """
-        for rob in robots:
-            rob.move(dt, objects)
-
-        goals_reached = sum(rob.reached_target() for rob in robots)
-        screen.fill(data["colors"]["room"]) 
-
-
-        for obj in objects:
-            obj.draw(screen)
-
-        elapsed_ms = pygame.time.get_ticks() - start_ticks
-        elapsed_sec = elapsed_ms / 1000
-
-        efficiency = goals_reached / elapsed_sec if elapsed_sec > 0 else 0
-
-        stats_text = f"Достигнуто целей: {goals_reached} | Время: {elapsed_sec:.1f} с | Эффективность: {efficiency:.3f} целей/с"
-        text_surface = font.render(stats_text, True, (0, 0, 0))
-        screen.blit(text_surface, (10, 10))
-        
-        count -= 1
-        if count < 0:
-            count = data['fps']
-
-        pygame.display.update()
-        clock.tick(data["fps"])
-
-#main("simple")
-#main(mission_circle(20))
+import pygame
+from sys import exit
+
+from room import Room
+from robot_simple import Robot
+from obstacle import Obstacle
+from obstacle_set import ObstacleSet
+from spatial_index import SpatialGrid, NeighbourList
+from missions import mission_circle, mission_circle_hole
+from scenarios import load_mission
+from profiling import profiler
+from renderer import Renderer, Scene, Snapshot
+
+def main(mission, profile=None, ccd=False, skin=None):
+    """ profile - период (с) печати сводки замеров по фазам (см. profiling.py);
+        клавиша P включает и выключает замеры во время работы;
+        ccd=True - непрерывная проверка столкновений (без туннелирования сквозь тонкие препятствия);
+        skin - запас списков соседей Верле (spatial_index.NeighbourList), больше удвоенного перемещения за тик """
+    pygame.init()
+    if profile is not None:
+        profiler.enable(every=profile)
+
+    """ загрузка миссии из файла (в том числе в схеме simple.json) или из генератора """
+    data = load_mission(mission)
+
+    renderer = Renderer(Scene(data))
+    dt = 1 / data["fps"]
+
+    room = Room(data["size"], data["colors"]["room"])
+
+    obstacles = []
+    for ob in data["obstacles"]:
+        obstacles.append(Obstacle(*ob, data["colors"]["obstacle"]))
+    obstacles = ObstacleSet(obstacles)
+
+    robots = []
+    for rb in data["robots"]:
+        robots.append(Robot(*rb, data["rsize"], data["colors"]["robot"]))
+
+    objects = [room, obstacles] + robots
+    snapshot = Snapshot(len(robots))
+    grid = SpatialGrid(2 * data["rsize"], obstacles, robots, [room], data.get("obstacle_cells"))
+    if skin is not None:
+        grid = NeighbourList(grid, skin)
+
+    count = data['fps']
+    ticks = 0
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                exit()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                if profiler.enabled:
+                    profiler.disable()
+                else:
+                    profiler.enable(every=profile or 5)
+
+        if count == 0:
+            """ обновляем скорость (управление) раз в секунду (один раз в fps тиков) """
+            with profiler.phase("control"):
+                for rob in robots:
+                    rob.update(room, obstacles, robots)
+
+        """ обновляем положение fps на каждом тике """
+        with profiler.phase("physics"):
+            for rob in robots:
+                rob.move(dt, objects, grid, ccd)
+
+        count -= 1
+        if count < 0:
+            count = data['fps']
+        ticks += 1
+
+        """ отрисовка снимка положений роботов: статический слой кэширован, обновляются только изменившиеся области """
+        snapshot.capture_robots(robots, ticks * dt, ticks)
+        renderer.draw(snapshot)
+        renderer.tick()
+        profiler.tick()
+
+#main("simple")
+#main(mission_circle(20))
 main(mission_circle_hole(10))
\ No newline at end of file
@@ -1,25 +1,50 @@
-import pygame
-from vector_utils import distance, clamp
-
-class Obstacle:
-    """ препятствие прямоугольной формы """
-    def __init__(self, pos, size, color):
-       self.pos = pos
-       self.size = size
-       self.color = color 
-    def draw(self, screen):
-        pygame.draw.rect(screen, self.color, pygame.Rect(*self.pos, *self.size))
-    def check_collision(self, a, r):
-        """ проверка столкновения робота (a, r) с данным препятствием (a - положение, r - радиус) """
-        return self.inside(a) or self.dist(a) < r
-    def inside(self, a):
-        """ находится ли робот 'внутри' препятствия """
-        c = [a[i] > self.pos[i] and a[i] < self.pos[i] + self.size[i] for i in [0, 1]]
-        return c[0] and c[1]
-    def dist(self, a):
-        """ расстояние от точки a до границы препятствия """
-        d1 = distance(a, (clamp(self.pos[0], self.pos[0] + self.size[0], a[0]), self.pos[1]))
-        d2 = distance(a, (clamp(self.pos[0], self.pos[0] + self.size[0], a[0]), self.pos[1] + self.size[1]))
-        d3 = distance(a, (self.pos[0], clamp(self.pos[1], self.pos[1] + self.size[1], a[1])))
-        d4 = distance(a, (self.pos[0] + self.size[0], clamp(self.pos[1], self.pos[1] + self.size[1], a[1])))
-        return min(d1, d2, d3, d4)
\ No newline at end of file
+import pygame
+from vector_utils import distance, clamp, sweep_circle
+
+def _slab(a, d, lo, hi):
+    """ доля t из [0, 1] перемещения d из точки a до входа в прямоугольник (lo, hi); None - не входит """
+    t0, t1 = 0.0, 1.0
+    for i in [0, 1]:
+        if d[i] == 0:
+            if a[i] <= lo[i] or a[i] >= hi[i]:
+                return None
+            continue
+        u, v = (lo[i] - a[i]) / d[i], (hi[i] - a[i]) / d[i]
+        t0, t1 = max(t0, min(u, v)), min(t1, max(u, v))
+        if t0 > t1:
+            return None
+    return t0
+
+class Obstacle:
+    """ препятствие прямоугольной формы """
+    def __init__(self, pos, size, color):
+       self.pos = pos
+       self.size = size
+       self.color = color 
+    def draw(self, screen):
+        pygame.draw.rect(screen, self.color, pygame.Rect(*self.pos, *self.size))
+    def check_collision(self, a, r):
+        """ проверка столкновения робота (a, r) с данным препятствием (a - положение, r - радиус) """
+        return self.inside(a) or self.dist(a) < r
+    def inside(self, a):
+        """ находится ли робот 'внутри' препятствия """
+        c = [a[i] > self.pos[i] and a[i] < self.pos[i] + self.size[i] for i in [0, 1]]
+        return c[0] and c[1]
+    def dist(self, a):
+        """ расстояние от точки a до границы препятствия """
+        d1 = distance(a, (clamp(self.pos[0], self.pos[0] + self.size[0], a[0]), self.pos[1]))
+        d2 = distance(a, (clamp(self.pos[0], self.pos[0] + self.size[0], a[0]), self.pos[1] + self.size[1]))
+        d3 = distance(a, (self.pos[0], clamp(self.pos[1], self.pos[1] + self.size[1], a[1])))
+        d4 = distance(a, (self.pos[0] + self.size[0], clamp(self.pos[1], self.pos[1] + self.size[1], a[1])))
+        return min(d1, d2, d3, d4)
+    def sweep(self, a, d, r):
+        """ доля t из [0, 1] перемещения d робота (a, r) до касания препятствия; None - касания нет.
+            Касание - вход центра робота в прямоугольник, расширенный на r со скруглёнными углами """
+        if self.check_collision(a, r):
+            return 0.0 if self.check_collision((a[0] + d[0], a[1] + d[1]), r) else None
+        x0, y0 = self.pos
+        x1, y1 = x0 + self.size[0], y0 + self.size[1]
+        times = [_slab(a, d, (x0 - r, y0), (x1 + r, y1)), _slab(a, d, (x0, y0 - r), (x1, y1 + r))]
+        times += [sweep_circle(a, d, c, r) for c in [(x0, y0), (x1, y0), (x0, y1), (x1, y1)]]
+        times = [t for t in times if t is not None]
+        return min(times) if times else None
\ No newline at end of file
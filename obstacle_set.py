@@ -0,0 +1,125 @@
+import numpy as np
+from vector_utils import batch_clamp, batch_norm
+
+
+class ObstacleSet:
+    """ набор прямоугольных препятствий в виде массива rects (M, 4): x, y, ширина, высота;
+        ведёт себя как список Obstacle и как один объект для проверки столкновений """
+    def __init__(self, obstacles=(), rects=None):
+        self.items = list(obstacles)
+        if rects is None:
+            rects = [[*ob.pos, *ob.size] for ob in self.items]
+        self.rects = np.array(rects, dtype=float).reshape(-1, 4)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def subset(self, idx):
+        """ набор из препятствий с номерами idx (в том же порядке) """
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        items = [self.items[i] for i in idx.tolist()] if self.items else []
+        return ObstacleSet(items, self.rects[idx])
+
+    def query(self, points):
+        """ для точек (N, 2) и всех препятствий за один проход:
+            расстояния до границ (N, M) (как Obstacle.dist), флаги 'внутри' (N, M) (как Obstacle.inside)
+            и ближайшие точки прямоугольников (N, M, 2) """
+        p = np.asarray(points, dtype=float).reshape(-1, 1, 2)
+        lo = self.rects[np.newaxis, :, 0:2]
+        hi = lo + self.rects[np.newaxis, :, 2:4]
+
+        closest = batch_clamp(lo, hi, p)
+        inside = ((p > lo) & (p < hi)).all(axis=2)
+
+        # расстояния до четырёх сторон: верхней, нижней, левой, правой
+        dx = np.stack([p[..., 0] - closest[..., 0], p[..., 0] - closest[..., 0],
+                       p[..., 0] - lo[..., 0], p[..., 0] - hi[..., 0]])
+        dy = np.stack([p[..., 1] - lo[..., 1], p[..., 1] - hi[..., 1],
+                       p[..., 1] - closest[..., 1], p[..., 1] - closest[..., 1]])
+        dist = batch_norm(np.stack([dx, dy], axis=-1)).min(axis=0)
+        return dist, inside, closest
+
+    def collisions(self, points, r):
+        """ флаги столкновения (N,) кругов радиуса r с центрами points хотя бы с одним препятствием """
+        if not len(self):
+            return np.zeros(len(points), dtype=bool)
+        # снаружи расстояние до границы равно расстоянию до ближайшей точки, внутри - столкновение и так
+        p = np.asarray(points, dtype=float).reshape(-1, 1, 2)
+        lo = self.rects[np.newaxis, :, 0:2]
+        hi = lo + self.rects[np.newaxis, :, 2:4]
+        inside = ((p > lo) & (p < hi)).all(axis=2)
+        return (inside | (batch_norm(p - batch_clamp(lo, hi, p)) < r)).any(axis=1)
+
+    def nearest(self, points):
+        """ для каждой точки: расстояние до ближайшего препятствия и его ближайшая точка
+            (при равенстве выбирается препятствие с меньшим номером) """
+        n = len(np.asarray(points).reshape(-1, 2))
+        if not len(self):
+            return np.full(n, np.inf), np.full((n, 2), np.nan)
+        dist, _, closest = self.query(points)
+        i = np.argmin(dist, axis=1)
+        return dist[np.arange(n), i], closest[np.arange(n), i]
+
+    def impacts(self, points, disp, r):
+        """ для кругов радиуса r с центрами points (N, 2), перемещающихся на disp (N, 2):
+            доля перемещения до первого касания любого препятствия (N,), np.inf - касания нет
+            (как Obstacle.sweep для всех пар за один проход) """
+        a = np.asarray(points, dtype=float).reshape(-1, 1, 2)
+        d = np.asarray(disp, dtype=float).reshape(-1, 1, 2)
+        n = len(a)
+        if not len(self):
+            return np.full(n, np.inf)
+        lo = self.rects[np.newaxis, :, 0:2]
+        hi = lo + self.rects[np.newaxis, :, 2:4]
+
+        # вход в два прямоугольника, расширенных на r по x и по y
+        times = []
+        for grow in (np.array([r, 0.0]), np.array([0.0, r])):
+            l, h = lo - grow, hi + grow
+            with np.errstate(divide="ignore", invalid="ignore"):
+                u, v = (l - a) / d, (h - a) / d
+            inside = (a > l) & (a < h)
+            near = np.where(d != 0, np.minimum(u, v), np.where(inside, -np.inf, np.inf))
+            far = np.where(d != 0, np.maximum(u, v), np.where(inside, np.inf, -np.inf))
+            t0 = np.maximum(near.max(axis=2), 0.0)
+            t1 = np.minimum(far.min(axis=2), 1.0)
+            times.append(np.where(t0 <= t1, t0, np.inf))
+
+        # касание скруглённых углов - окружностей радиуса r с центрами в вершинах
+        A = (d ** 2).sum(axis=2)
+        for x in (lo[..., 0], hi[..., 0]):
+            for y in (lo[..., 1], hi[..., 1]):
+                f = a - np.stack([x, y], axis=-1)
+                B = (f * d).sum(axis=2)
+                C = (f ** 2).sum(axis=2) - r ** 2
+                disc = B * B - A * C
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    t = (-B - np.sqrt(np.maximum(disc, 0))) / A
+                times.append(np.where((A > 0) & (B < 0) & (C >= 0) & (disc >= 0) & (t <= 1), t, np.inf))
+
+        t = np.min(times, axis=0)
+        # круг уже касается препятствия: запрещено перемещение, которое заканчивается в этом препятствии
+        dist, inside, _ = self.query(a[:, 0])
+        start = inside | (dist < r)
+        dist, inside, _ = self.query(a[:, 0] + d[:, 0])
+        end = inside | (dist < r)
+        return np.where(start, np.where(end, 0.0, np.inf), t).min(axis=1)
+
+    def sweep(self, a, d, r):
+        """ доля t перемещения d робота (a, r) до касания любого препятствия набора; None - касания нет """
+        t = self.impacts((a,), (d,), r)[0]
+        return float(t) if np.isfinite(t) else None
+
+    def check_collision(self, a, r):
+        """ проверка столкновения робота (a, r) с любым препятствием набора """
+        return bool(self.collisions((a,), r)[0])
+
+    def draw(self, screen):
+        for ob in self.items:
+            ob.draw(screen)
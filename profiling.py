@@ -0,0 +1,134 @@
+import time
+from contextlib import nullcontext
+
+# Замеры по фазам цикла миссии: control (управление), physics (перемещение и столкновения),
+# nearest (поиск ближайшего объекта), esn_step (шаг резервуаров), readout (обучение W_out),
+# render (отрисовка) и tick (полный тик - интервал между вызовами Profiler.tick).
+# Фазы вкладываются: control включает nearest, esn_step и readout.
+# Времена копятся в гистограммах по степеням двойки (в наносекундах), поэтому память не растёт с числом тиков.
+
+_OFF = nullcontext()
+
+
+class PhaseStats:
+    """ счётчики одной фазы: число замеров, сумма, максимум и гистограмма по степеням двойки """
+    __slots__ = ("count", "total", "max", "hist")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.hist = [0] * 64 # hist[b] - число замеров длительностью [2^(b-1), 2^b) нс
+
+    def add(self, ns):
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        self.hist[ns.bit_length()] += 1
+
+    def percentile(self, q):
+        """ верхняя граница корзины гистограммы, в которую попадает квантиль q, нс """
+        rank = q * self.count
+        seen = 0
+        for b, n in enumerate(self.hist):
+            seen += n
+            if n and seen >= rank:
+                return min(1 << b, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total / 1e6,
+            "mean_us": self.total / self.count / 1e3 if self.count else 0.0,
+            "p50_us": self.percentile(0.5) / 1e3,
+            "p99_us": self.percentile(0.99) / 1e3,
+            "max_us": self.max / 1e3,
+        }
+
+
+class _Timer:
+    """ контекст замера одной фазы (создаётся один раз на фазу) """
+    __slots__ = ("stats", "start")
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.stats.add(time.perf_counter_ns() - self.start)
+
+
+class Profiler:
+    """ замеры фаз цикла миссии; включается и выключается во время работы.
+        Выключенный профайлер возвращает из phase() общий пустой контекст - без замеров и выделений памяти.
+        every - период (с) вызова callback(summary) из tick(); по умолчанию - печать сводки """
+    def __init__(self, enabled=False, every=None, callback=None):
+        self.enabled = False
+        self.every = None
+        self.callback = None
+        self.reset()
+        if enabled:
+            self.enable(every, callback)
+
+    def enable(self, every=None, callback=None):
+        self.enabled = True
+        self.every = every
+        self.callback = callback or report
+        self._last_tick = None
+        self._last_dump = time.perf_counter_ns()
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.phases = {}
+        self._timers = {}
+        self._last_tick = None
+        self._last_dump = time.perf_counter_ns()
+
+    def phase(self, name):
+        """ with profiler.phase("physics"): ... """
+        if not self.enabled:
+            return _OFF
+        timer = self._timers.get(name)
+        if timer is None:
+            stats = self.phases[name] = PhaseStats()
+            timer = self._timers[name] = _Timer(stats)
+        return timer
+
+    def tick(self):
+        """ конец тика цикла миссии: замер длительности тика и, если пора, периодическая сводка """
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        if self._last_tick is None:
+            """ первый тик после включения: отсчёт периода сводки начинается с него """
+            self._last_dump = now
+        else:
+            stats = self.phases.get("tick")
+            if stats is None:
+                stats = self.phases["tick"] = PhaseStats()
+            stats.add(now - self._last_tick)
+        self._last_tick = now
+        if self.every is not None and now - self._last_dump >= self.every * 1e9:
+            self._last_dump = now
+            self.callback(self.summary())
+
+    def summary(self):
+        return {name: stats.summary() for name, stats in self.phases.items()}
+
+
+def report(summary):
+    """ печать сводки: по строке на фазу """
+    for name, s in summary.items():
+        print(f"{name:>9}: {s['count']:7d} раз | всего {s['total_ms']:9.1f} мс | среднее {s['mean_us']:9.1f} мкс"
+              f" | p50 {s['p50_us']:9.1f} | p99 {s['p99_us']:9.1f} | max {s['max_us']:9.1f} мкс")
+
+
+# общий профайлер процесса: фазы размечены в Simulation, FleetESN, robot_esn, Renderer и mission_*.py
+profiler = Profiler()
@@ -0,0 +1,163 @@
+import json
+from pathlib import Path
+import numpy as np
+
+from obstacle_set import ObstacleSet
+from vector_utils import batch_distance
+from esn import batch_reward
+
+# Запись - каталог из трёх файлов:
+#   meta.json    - миссия (размер комнаты, препятствия, rsize, fps, цвета);
+#   records.bin  - записи тиков подряд (тип RECORD, по одной на робота и тик), только дозапись;
+#   episodes.bin - индекс эпизодов (тип EPISODE): первая запись, число тиков и роботов.
+# Оба бинарных файла читаются через np.memmap, поэтому многочасовые прогоны не загружаются в RAM.
+
+RECORD = np.dtype([
+    ("tick", "<u4"),
+    ("control", "?"),          # был ли на этом тике шаг управления
+    ("pos", "<f4", 2),
+    ("vel", "<f4", 2),
+    ("target", "<f4", 2),
+    ("features", "<f4", 8),    # признаки, предсказание и награда - последнего шага управления
+    ("prediction", "<f4", 2),
+    ("reward", "<f4"),
+])
+
+EPISODE = np.dtype([
+    ("start", "<u8"),          # номер первой записи в records.bin
+    ("ticks", "<u4"),
+    ("robots", "<u4"),
+])
+
+
+class Recorder:
+    """ потоковая запись траекторий: тики копятся в буфере на chunk_ticks тиков и дописываются в файл """
+    def __init__(self, path, data, chunk_ticks=256):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta = self.path / "meta.json"
+        keys = ("size", "fps", "rsize", "colors", "obstacles")
+        text = json.dumps({k: data[k] for k in keys}, ensure_ascii=False)
+        if not meta.exists():
+            meta.write_text(text, encoding="utf-8")
+        elif json.loads(meta.read_text(encoding="utf-8")) != json.loads(text):
+            """ эпизоды одной записи читаются с общей миссией из meta.json - другую миссию не дописываем """
+            raise ValueError(f"запись {self.path} сделана для другой миссии (meta.json не совпадает)")
+        self.records = open(self.path / "records.bin", "ab")
+        self.episodes = open(self.path / "episodes.bin", "ab")
+        self.chunk_ticks = chunk_ticks
+        self.buffer = None
+
+    def begin_episode(self, n_robots):
+        self.start = self.records.tell() // RECORD.itemsize
+        self.ticks = 0
+        self.n_robots = n_robots
+        self.buffer = np.zeros((self.chunk_ticks, n_robots), dtype=RECORD)
+        self.filled = 0
+
+    def record(self, sim):
+        """ запись одного тика Simulation (подходит как on_tick для Simulation.run) """
+        if self.buffer is None:
+            self.begin_episode(sim.n_robots)
+        row = self.buffer[self.filled]
+        row["tick"] = sim.ticks
+        row["control"] = sim.controlled
+        row["pos"] = sim.pos
+        row["vel"] = sim.vel
+        row["target"] = sim.target
+        row["features"] = sim.last_features
+        row["prediction"] = sim.last_prediction
+        if sim.fleet is not None and sim.fleet.frozen:
+            """ замороженный флот наград не считает - для записи они вычисляются пакетно по признакам """
+            row["reward"] = batch_reward(sim.last_features)
+        else:
+            row["reward"] = sim.last_reward
+        self.filled += 1
+        self.ticks += 1
+        if self.filled == self.chunk_ticks:
+            self.flush()
+
+    def flush(self):
+        self.buffer[:self.filled].tofile(self.records)
+        self.records.flush()
+        self.filled = 0
+
+    def end_episode(self):
+        """ дописывает остаток буфера и запись индекса эпизода """
+        if self.buffer is None:
+            return
+        self.flush()
+        np.array([(self.start, self.ticks, self.n_robots)], dtype=EPISODE).tofile(self.episodes)
+        self.episodes.flush()
+        self.buffer = None
+
+    def close(self):
+        self.end_episode()
+        self.records.close()
+        self.episodes.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordingReader:
+    """ ленивое чтение записи: эпизоды - отображения records.bin в память формы (тики, роботы) """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        self.index = np.fromfile(self.path / "episodes.bin", dtype=EPISODE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def episode(self, i):
+        start, ticks, robots = self.index[i]
+        return np.memmap(self.path / "records.bin", dtype=RECORD, mode="r",
+                         offset=int(start) * RECORD.itemsize, shape=(int(ticks), int(robots)))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.episode(i)
+
+
+class ReplayState:
+    """ состояние записанного эпизода в интерфейсе Simulation, достаточном для Renderer """
+    def __init__(self, meta, records):
+        self.data = meta
+        self.size = np.array(meta["size"], dtype=float)
+        self.fps = meta["fps"]
+        self.radius = meta["rsize"]
+        self.obstacles = ObstacleSet(rects=[[*pos, *size] for pos, size in meta["obstacles"]])
+        self.records = records
+        self.ticks = 0
+        self.seek(0)
+
+    def seek(self, tick):
+        self.row = self.records[tick]
+        self.pos = self.row["pos"].astype(float)
+        self.target = self.row["target"].astype(float)
+        self.ticks = int(self.row["tick"][0])
+
+    @property
+    def time(self):
+        return self.ticks / self.fps
+
+    def reached_target(self):
+        return batch_distance(self.pos, self.target) < self.radius / 5
+
+
+def replay(path, episode=0, speed=1.0):
+    """ отрисовка записанного эпизода без пересчёта ESN; speed - множитель скорости воспроизведения """
+    from renderer import Renderer
+    reader = RecordingReader(path)
+    state = ReplayState(reader.meta, reader.episode(episode))
+    renderer = Renderer(state)
+    for tick in range(len(state.records)):
+        if not renderer.handle_events():
+            return
+        state.seek(tick)
+        renderer.draw()
+        renderer.clock.tick(state.fps * speed)
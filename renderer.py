@@ -0,0 +1,197 @@
+import threading, time
+import numpy as np
+import pygame
+
+from obstacle_set import ObstacleSet
+from profiling import profiler
+from scheduler import FixedStepClock
+
+
+class Scene:
+    """ неизменная часть миссии для отрисовки без Simulation: размеры, препятствия, цели роботов """
+    def __init__(self, data):
+        self.data = data
+        self.size = np.array(data["size"], dtype=float)
+        self.fps = data["fps"]
+        self.radius = data["rsize"]
+        self.obstacles = ObstacleSet(rects=[[*pos, *size] for pos, size in data["obstacles"]])
+        self.target = np.array([target for _, target in data["robots"]], dtype=float).reshape(-1, 2)
+
+
+class Snapshot:
+    """ снимок изменяемого состояния для отрисовки: положения роботов, флаги достижения цели, время """
+    def __init__(self, n_robots):
+        self.pos = np.zeros((n_robots, 2))
+        self.reached = np.zeros(n_robots, dtype=bool)
+        self.time = 0.0
+        self.ticks = 0
+
+    def capture(self, sim):
+        """ копия состояния Simulation (или ReplayState) """
+        self.pos[:] = sim.pos
+        self.reached[:] = sim.reached_target()
+        self.time = sim.time
+        self.ticks = sim.ticks
+
+    def capture_robots(self, robots, time, ticks=0):
+        """ копия состояния списка объектов Robot (mission_*.py) """
+        for i, rob in enumerate(robots):
+            self.pos[i] = rob.pos
+            self.reached[i] = rob.reached_target()
+        self.time = time
+        self.ticks = ticks
+
+    def copy_to(self, other):
+        other.pos[:] = self.pos
+        other.reached[:] = self.reached
+        other.time = self.time
+        other.ticks = self.ticks
+
+
+class SnapshotBuffer:
+    """ двойной буфер снимков между потоком симуляции и потоком отрисовки: симуляция пишет в задний снимок
+        и меняет его местами с передним; отрисовка копирует передний под блокировкой и никогда не задерживает
+        симуляцию дольше копирования. Промежуточные снимки, которые отрисовка не успела взять, пропускаются """
+    def __init__(self, n_robots):
+        self.front = Snapshot(n_robots)
+        self.back = Snapshot(n_robots)
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def publish(self, sim):
+        self.back.capture(sim)
+        with self.lock:
+            self.front, self.back = self.back, self.front
+            self.version += 1
+
+    def read(self, out):
+        """ копия последнего снимка в out; возвращает его номер """
+        with self.lock:
+            self.front.copy_to(out)
+            return self.version
+
+
+class Renderer:
+    """ отрисовка состояния Simulation в окне pygame (необязательный интерфейс к безоконному ядру).
+        Комната, препятствия и цели рисуются один раз в кэшированный слой; каждый кадр перерисовываются
+        только прямоугольники роботов (старые - стираются копией из слоя) и строка статистики """
+    def __init__(self, sim):
+        pygame.init()
+        self.sim = sim
+        self.colors = sim.data["colors"]
+        self.screen = pygame.display.set_mode([int(v) for v in sim.size])
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.SysFont('Arial', 18)
+        self.snapshot = Snapshot(len(sim.target))
+
+        self.static = self._draw_static()
+        self.screen.blit(self.static, (0, 0))
+        pygame.display.flip()
+        self.dirty = []   # прямоугольники, нарисованные в прошлом кадре
+        self.text = None  # строка статистики и её поверхность
+        self.text_surface = None
+
+    def _draw_static(self):
+        sim, r = self.sim, self.sim.radius
+        layer = pygame.Surface(self.screen.get_size()).convert()
+        layer.fill(self.colors["room"])
+        for x, y, w, h in sim.obstacles.rects:
+            pygame.draw.rect(layer, self.colors["obstacle"], pygame.Rect(x, y, w, h))
+        for tx, ty in sim.target:
+            pygame.draw.ellipse(layer, 'Lightgrey', pygame.Rect(tx - r, ty - r, 2 * r, 2 * r), 2)
+        return layer
+
+    def handle_events(self):
+        """ обработка событий окна; False - окно закрыто """
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return False
+        return True
+
+    def draw(self, snapshot=None):
+        """ отрисовка снимка; по умолчанию - текущего состояния sim """
+        if snapshot is None:
+            snapshot = self.snapshot
+            snapshot.capture(self.sim)
+        with profiler.phase("render"):
+            self._draw(snapshot)
+
+    def _draw(self, snapshot):
+        r = self.sim.radius
+        for rect in self.dirty:
+            self.screen.blit(self.static, rect, rect)
+
+        drawn = []
+        for (x, y), done in zip(snapshot.pos, snapshot.reached):
+            rect = pygame.Rect(round(x - r), round(y - r), 2 * r, 2 * r)
+            pygame.draw.ellipse(self.screen, "Green" if done else self.colors["robot"], rect)
+            drawn.append(rect)
+
+        goals_reached = int(snapshot.reached.sum())
+        elapsed_sec = snapshot.time
+        efficiency = goals_reached / elapsed_sec if elapsed_sec > 0 else 0
+
+        stats_text = f"Достигнуто целей: {goals_reached} | Время: {elapsed_sec:.1f} с | Эффективность: {efficiency:.3f} целей/с"
+        if stats_text != self.text:
+            """ текст меняется не чаще раза в 0.1 с модельного времени - рендерим его только при изменении """
+            self.text = stats_text
+            self.text_surface = self.font.render(stats_text, True, (0, 0, 0))
+        drawn.append(self.screen.blit(self.text_surface, (10, 10)))
+
+        pygame.display.update(self.dirty + drawn)
+        self.dirty = drawn
+
+    def tick(self):
+        """ ограничение частоты кадров реальным временем """
+        self.clock.tick(self.sim.fps)
+
+
+def run_async(sim, max_steps=None, speed=1.0, renderer=None, on_tick=None):
+    """ симуляция в отдельном потоке, отрисовка последних снимков в основном потоке (pygame требует его).
+        Симуляция не ждёт отрисовку: кадры, которые не успели нарисовать, пропускаются.
+        speed - во сколько раз быстрее реального времени (None - без ограничения скорости);
+        on_tick(sim) вызывается в потоке симуляции после каждого тика (например, Recorder.record) """
+    if renderer is None:
+        renderer = Renderer(sim)
+    buffer = SnapshotBuffer(sim.n_robots)
+    buffer.publish(sim)
+    stop = threading.Event()
+
+    def simulate():
+        physics_clock = FixedStepClock(sim.dt, speed) if speed else None
+        last = time.perf_counter()
+        while not stop.is_set() and (max_steps is None or sim.ticks < max_steps):
+            steps = 1
+            if physics_clock is not None:
+                now = time.perf_counter()
+                steps = physics_clock.steps(now - last)
+                last = now
+                if steps == 0:
+                    time.sleep(sim.dt / 4)
+                    continue
+            if max_steps is not None:
+                steps = min(steps, max_steps - sim.ticks)
+            for _ in range(steps):
+                sim.step()
+                if on_tick is not None:
+                    on_tick(sim)
+            buffer.publish(sim)
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=simulate, daemon=True)
+    thread.start()
+    snapshot = Snapshot(sim.n_robots)
+    shown = 0
+    while thread.is_alive():
+        if not renderer.handle_events():
+            stop.set()
+            break
+        version = buffer.read(snapshot)
+        if version != shown:
+            renderer.draw(snapshot)
+            shown = version
+        renderer.tick()
+        profiler.tick()
+    thread.join()
+    return sim.metrics(time.perf_counter() - start)
@@ -1,71 +1,106 @@
-import pygame, math, random
-from vector_utils import norm, distance, rotate, diff
-
-class Robot:
-    """ робот круглой формы """
-    def __init__(self, pos, target, radius, color):
-       self.pos = pos
-       self.target = target
-       self.radius = radius
-       self.v0 = 100 # magic constant! 
-       self.vmax = 200
-       self.vel = rotate((self.v0, 0), random.uniform(0, 2 * math.pi))
-       self.tcolor = 'Lightgrey'
-       self.initcolor = color
-       self.state = 0 # 0 - free, 1 - collided
-
-    def reached_target(self):
-        return distance(self.pos, self.target) < self.radius / 5
-    
-    def check_collision(self, a, r):
-        """ проверка столкновения с другим роботом """
-        return distance(self.pos, a) < r + self.radius
-    
-    def update(self, room, obstacles, robots):
-        """ обновление скорости """
-        if distance(self.pos, self.target) < self.radius / 20:
-            """ цель достигнута """
-            self.vel = (0, 0)
-            return
-        if self.state == 1:
-            """ столкновение - меняем скорость на случайную """
-            self.vel = rotate((self.v0, 0), random.uniform(0, 2 * math.pi))
-        else:
-            """ направляем скорость на цель """
-            self.vel = diff(self.target, self.pos) 
-        """ ограничиваем скорость максимальным значением """
-        l = norm(self.vel)
-        if l > self.vmax:
-            self.vel = (self.vel[0] / l * self.vmax, self.vel[1] / l * self.vmax)
-
-    def move(self,  dt, objects):
-        """ передвижение робота, детекция столкновения """
-        pos = self.pos
-        self.pos = (self.pos[0] + dt * self.vel[0], self.pos[1] + dt * self.vel[1])
-        self.state = 0
-        if self.is_collided(objects):
-            """ если есть столкновением с любым объектом, отменяем перемещение """
-            self.state = 1
-            self.pos = pos
-
-    def is_collided(self, objects):
-        """ проверка столкновения с объектами из списка objects """
-        for obj in objects:
-            if obj == self:
-                continue
-            if obj.check_collision(self.pos, self.radius):
-                return True
-        return False 
-    def color(self):
-        """ Текущий цвет робота """
-        if distance(self.pos, self.target) < self.radius / 5:
-            return "Green"
-        return self.initcolor
-    
-    def draw(self, screen):
-        r = self.radius
-        x, y = self.pos[0] - r, self.pos[1] - r
-        pygame.draw.ellipse(screen, self.color(), pygame.Rect(x, y, 2 * r, 2 * r))
-        r = self.radius
-        x, y = self.target[0] - r, self.target[1] - r
-        pygame.draw.ellipse(screen, self.tcolor, pygame.Rect(x, y, 2 * r, 2 * r), 2)
+import pygame, math, random
+from vector_utils import norm, distance, rotate, diff, sweep_circle
+
+class Robot:
+    """ робот круглой формы """
+    def __init__(self, pos, target, radius, color):
+       self.pos = pos
+       self.target = target
+       self.radius = radius
+       self.v0 = 100 # magic constant! 
+       self.vmax = 200
+       self.vel = rotate((self.v0, 0), random.uniform(0, 2 * math.pi))
+       self.tcolor = 'Lightgrey'
+       self.initcolor = color
+       self.state = 0 # 0 - free, 1 - collided
+
+    def reached_target(self):
+        return distance(self.pos, self.target) < self.radius / 5
+    
+    def check_collision(self, a, r):
+        """ проверка столкновения с другим роботом """
+        return distance(self.pos, a) < r + self.radius
+
+    def sweep(self, a, d, r):
+        """ доля перемещения d робота (a, r) до касания с данным роботом; None - касания нет """
+        return sweep_circle(a, d, self.pos, r + self.radius)
+    
+    def update(self, room, obstacles, robots):
+        """ обновление скорости """
+        if distance(self.pos, self.target) < self.radius / 20:
+            """ цель достигнута """
+            self.vel = (0, 0)
+            return
+        if self.state == 1:
+            """ столкновение - меняем скорость на случайную """
+            self.vel = rotate((self.v0, 0), random.uniform(0, 2 * math.pi))
+        else:
+            """ направляем скорость на цель """
+            self.vel = diff(self.target, self.pos) 
+        """ ограничиваем скорость максимальным значением """
+        l = norm(self.vel)
+        if l > self.vmax:
+            self.vel = (self.vel[0] / l * self.vmax, self.vel[1] / l * self.vmax)
+
+    def move(self,  dt, objects, grid=None, ccd=False):
+        """ передвижение робота, детекция столкновения;
+            ccd=True - непрерывная проверка: робот доходит до касания с первым объектом на пути,
+            поэтому не проскакивает сквозь тонкие препятствия даже при большом шаге dt """
+        pos = self.pos
+        d = (dt * self.vel[0], dt * self.vel[1])
+        self.pos = (self.pos[0] + d[0], self.pos[1] + d[1])
+        self.state = 0
+        if ccd:
+            t = self.time_of_impact(pos, d, objects, grid)
+            if t is not None:
+                """ перемещаемся до касания (с зазором 1e-6, чтобы не оказаться внутри из-за округления) """
+                self.state = 1
+                l = norm(d)
+                t = max(t - 1e-6 / l, 0) if l > 0 else 0
+                self.pos = (pos[0] + t * d[0], pos[1] + t * d[1])
+                if self.is_collided(objects, grid):
+                    self.pos = pos
+        elif self.is_collided(objects, grid):
+            """ если есть столкновением с любым объектом, отменяем перемещение """
+            self.state = 1
+            self.pos = pos
+        if grid is not None:
+            grid.update(self)
+
+    def time_of_impact(self, a, d, objects, grid=None):
+        """ доля перемещения d из точки a до первого касания с объектами; None - путь свободен """
+        if grid is not None:
+            objects = grid.collision_candidates(a, self.radius + norm(d), self)
+        t = None
+        for obj in objects:
+            if obj is self:
+                continue
+            s = obj.sweep(a, d, self.radius)
+            if s is not None and (t is None or s < t):
+                t = s
+        return t
+
+    def is_collided(self, objects, grid=None):
+        """ проверка столкновения с объектами из списка objects
+            (grid - SpatialGrid по тем же объектам: проверяются только соседние) """
+        if grid is not None:
+            objects = grid.collision_candidates(self.pos, self.radius, self)
+        for obj in objects:
+            if obj == self:
+                continue
+            if obj.check_collision(self.pos, self.radius):
+                return True
+        return False 
+    def color(self):
+        """ Текущий цвет робота """
+        if distance(self.pos, self.target) < self.radius / 5:
+            return "Green"
+        return self.initcolor
+    
+    def draw(self, screen):
+        r = self.radius
+        x, y = self.pos[0] - r, self.pos[1] - r
+        pygame.draw.ellipse(screen, self.color(), pygame.Rect(x, y, 2 * r, 2 * r))
+        r = self.radius
+        x, y = self.target[0] - r, self.target[1] - r
+        pygame.draw.ellipse(screen, self.tcolor, pygame.Rect(x, y, 2 * r, 2 * r), 2)
@@ -1,16 +1,32 @@
-import pygame
-
-class Room:
-    """ помещение (прямоугольник, ограниченный стенками) """
-    def __init__(self, size, color):
-       self.size = size
-       self.color = color 
-    def draw(self, screen):
-        pygame.draw.rect(screen, self.color, pygame.Rect(0, 0, self.size[0], self.size[1]))
-    def check_collision(self, a, r):
-        """ проверка столкновения робота (a, r) со стенками (a - положение, r - радиус) """
-        if a[0] < r or a[0] > self.size[0] - r:
-            return True
-        if a[1] < r or a[1] > self.size[1] - r:
-            return True
-        return False
\ No newline at end of file
+import pygame
+
+class Room:
+    """ помещение (прямоугольник, ограниченный стенками) """
+    def __init__(self, size, color):
+       self.size = size
+       self.color = color 
+    def draw(self, screen):
+        pygame.draw.rect(screen, self.color, pygame.Rect(0, 0, self.size[0], self.size[1]))
+    def check_collision(self, a, r):
+        """ проверка столкновения робота (a, r) со стенками (a - положение, r - радиус) """
+        if a[0] < r or a[0] > self.size[0] - r:
+            return True
+        if a[1] < r or a[1] > self.size[1] - r:
+            return True
+        return False
+    def sweep(self, a, d, r):
+        """ доля t из [0, 1] перемещения d робота (a, r) до касания стенок; None - касания нет """
+        if self.check_collision(a, r):
+            """ робот уже за стенкой: разрешено только возвращение внутрь """
+            return 0.0 if self.check_collision((a[0] + d[0], a[1] + d[1]), r) else None
+        t = None
+        for i in [0, 1]:
+            if d[i] > 0:
+                s = (self.size[i] - r - a[i]) / d[i]
+            elif d[i] < 0:
+                s = (r - a[i]) / d[i]
+            else:
+                continue
+            if s <= 1 and (t is None or s < t):
+                t = s
+        return t
\ No newline at end of file
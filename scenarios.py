@@ -0,0 +1,194 @@
+import hashlib, json, math
+from pathlib import Path
+import numpy as np
+
+from obstacle_set import ObstacleSet
+from spatial_index import obstacle_cells
+
+# Единая схема миссии (как у генераторов из missions.py):
+#   size      - (ширина, высота) комнаты;
+#   fps, rsize, colors;
+#   obstacles - [[(x, y), (ширина, высота)], ...];
+#   robots    - [[(x, y), (x цели, y цели)], ...];
+#   obstacle_cells - необязательный готовый индекс препятствий для SpatialGrid с ячейкой 2 * rsize.
+# normalize приводит к ней и другие варианты: width/height вместо size, плоские списки [x, y, w, h]
+# и [x, y, x цели, y цели] (как в simple.json), отсутствующие fps и colors.
+
+COLORS = {"room": "white", "obstacle": "black", "target": "lightgrey", "robot": "red"}
+CACHE_VERSION = 1 # меняется при изменении генераторов, чтобы не брать устаревшие сценарии из кэша
+
+
+def _pairs(items, name):
+    """ [[(a, b), (c, d)], ...] из плоских [a, b, c, d] или вложенных списков """
+    out = []
+    for item in items:
+        flat = np.asarray(item, dtype=float).reshape(-1)
+        if len(flat) != 4:
+            raise ValueError(f"{name}: ожидается 4 числа, получено {item}")
+        out.append([(float(flat[0]), float(flat[1])), (float(flat[2]), float(flat[3]))])
+    return out
+
+
+def normalize(data):
+    """ данные миссии в единой схеме """
+    if "size" in data:
+        size = tuple(data["size"])
+    elif "width" in data and "height" in data:
+        size = (data["width"], data["height"])
+    else:
+        raise ValueError("в миссии не задан размер комнаты: нужен size или width и height")
+    out = {
+        "size": size,
+        "fps": data.get("fps", 60),
+        "rsize": data["rsize"],
+        "colors": {**COLORS, **data.get("colors", {})},
+        "obstacles": _pairs(data.get("obstacles", []), "obstacles"),
+        "robots": _pairs(data["robots"], "robots"),
+    }
+    if "obstacle_cells" in data:
+        out["obstacle_cells"] = data["obstacle_cells"]
+    return out
+
+
+def load_scenario(path):
+    """ миссия из json-файла """
+    with open(path, encoding="utf-8") as f:
+        return normalize(json.load(f))
+
+
+def load_mission(mission):
+    """ данные миссии: имя json-файла (без .json), путь к нему или генератор из missions.py / scenarios.py """
+    if type(mission) == str:
+        return load_scenario(mission if mission.endswith(".json") else f"{mission}.json")
+    return normalize(mission())
+
+
+def catalog(directory="."):
+    """ json-файлы миссий каталога: имя -> путь """
+    found = {}
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if isinstance(data, dict) and "robots" in data:
+            found[path.stem] = str(path)
+    return found
+
+
+def place_robots(n, size, radius, obstacles=None, rng=None, margin=None, max_tries=100):
+    """ n точек, в которых роботы радиуса radius не пересекаются ни со стенками, ни с препятствиями,
+        ни друг с другом (расстояние не меньше 2 radius + margin). Кандидаты выбираются случайно пачками,
+        препятствия проверяются векторно, соседи - по хеш-сетке с ячейкой, равной минимальному расстоянию """
+    rng = np.random.default_rng(rng)
+    obstacles = obstacles if obstacles is not None else ObstacleSet()
+    margin = radius if margin is None else margin
+    spacing = 2 * radius + margin
+    lo = np.array([radius, radius], dtype=float)
+    hi = np.array(size, dtype=float) - radius
+
+    cells = {}
+    points = []
+    for _ in range(max_tries):
+        batch = rng.uniform(lo, hi, (max(2 * (n - len(points)), 64), 2))
+        batch = batch[~obstacles.collisions(batch, radius)]
+        for p in batch:
+            ci, cj = int(p[0] // spacing), int(p[1] // spacing)
+            if any(math.dist(p, points[k]) < spacing
+                   for di in (-1, 0, 1) for dj in (-1, 0, 1) for k in cells.get((ci + di, cj + dj), ())):
+                continue
+            cells.setdefault((ci, cj), []).append(len(points))
+            points.append(p)
+            if len(points) == n:
+                return np.array(points)
+    raise ValueError(f"не удалось разместить {n} роботов радиуса {radius}: размещено {len(points)}")
+
+
+def _mission(size, rsize, rects, n_robots, seed, fps=60):
+    """ миссия со случайными непересекающимися стартами и целями роботов """
+    rng = np.random.default_rng(seed)
+    obstacles = ObstacleSet(rects=rects)
+    starts = place_robots(n_robots, size, rsize, obstacles, rng)
+    targets = place_robots(n_robots, size, rsize, obstacles, rng)
+    return {
+        "size": tuple(size), "fps": fps, "rsize": rsize, "colors": dict(COLORS),
+        "obstacles": _pairs(obstacles.rects, "obstacles"),
+        "robots": _pairs(np.concatenate([starts, targets], axis=1), "robots"),
+    }
+
+
+def mission_grid(n_robots, size=(2000, 2000), rows=8, cols=8, block=0.6, rsize=12, seed=0):
+    """ генерация миссии "город": сетка rows x cols квадратных кварталов-препятствий, между ними - улицы;
+        block - доля шага сетки, занятая кварталом """
+    def M():
+        w, h = size[0] / cols, size[1] / rows
+        rects = [[(j + (1 - block) / 2) * w, (i + (1 - block) / 2) * h, block * w, block * h]
+                 for i in range(rows) for j in range(cols)]
+        return _mission(size, rsize, rects, n_robots, seed)
+    return M
+
+
+def mission_corridors(n_robots, size=(2000, 2000), corridors=6, wall=10, door=None, rsize=12, seed=0):
+    """ генерация миссии с коридорами: горизонтальные стены толщины wall с проёмом шириной door,
+        проёмы соседних стен - у противоположных краёв """
+    def M():
+        gap = 6 * rsize if door is None else door
+        step = size[1] / corridors
+        rects = []
+        for k in range(1, corridors):
+            y = k * step - wall / 2
+            if k % 2:
+                rects.append([0, y, size[0] - gap, wall])
+            else:
+                rects.append([gap, y, size[0] - gap, wall])
+        return _mission(size, rsize, rects, n_robots, seed)
+    return M
+
+
+def mission_random_field(n_robots, size=(2000, 2000), n_obstacles=100, min_side=20, max_side=120, rsize=12, seed=0):
+    """ генерация миссии со случайным полем прямоугольных препятствий """
+    def M():
+        rng = np.random.default_rng([seed, 1])
+        wh = rng.uniform(min_side, max_side, (n_obstacles, 2))
+        xy = rng.uniform(0, 1, (n_obstacles, 2)) * (np.array(size) - wh)
+        return _mission(size, rsize, np.concatenate([xy, wh], axis=1), n_robots, seed)
+    return M
+
+
+GENERATORS = {
+    "grid": mission_grid,
+    "corridors": mission_corridors,
+    "random_field": mission_random_field,
+}
+
+
+def cache_key(kind, params):
+    text = json.dumps({"kind": kind, "params": params, "version": CACHE_VERSION}, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def scenario(kind, cache_dir=".scenarios", **params):
+    """ сгенерированная миссия kind ("grid", "corridors", "random_field") с параметрами params.
+        Результат вместе с индексом препятствий для SpatialGrid хранится в cache_dir в файле,
+        имя которого - хеш параметров, поэтому повторные запуски не генерируют миссию заново """
+    path = Path(cache_dir) / f"{kind}-{cache_key(kind, params)}.npz"
+    if path.exists():
+        with np.load(path) as f:
+            meta = json.loads(str(f["meta"]))
+            data = {**meta,
+                    "obstacles": _pairs(f["obstacles"], "obstacles"),
+                    "robots": _pairs(f["robots"], "robots"),
+                    "obstacle_cells": f["obstacle_cells"]}
+        return normalize(data)
+
+    data = normalize(GENERATORS[kind](**params)())
+    rects = np.array([[*pos, *sz] for pos, sz in data["obstacles"]], dtype=float).reshape(-1, 4)
+    robots = np.array([[*pos, *target] for pos, target in data["robots"]], dtype=float).reshape(-1, 4)
+    data["obstacle_cells"] = obstacle_cells(rects, 2 * data["rsize"])
+    meta = {k: data[k] for k in ("size", "fps", "rsize", "colors")}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, meta=np.array(json.dumps(meta)), obstacles=rects, robots=robots,
+             obstacle_cells=data["obstacle_cells"])
+    tmp.replace(path)
+    return data
@@ -0,0 +1,63 @@
+import math
+import numpy as np
+
+
+class ControlScheduler:
+    """ расписание шагов управления: робот i управляется на тиках, где (tick - phases[i]) % periods[i] == 0.
+        Разные фазы у роботов с одним периодом распределяют шаги ESN по тикам равномерно (round-robin),
+        вместо того чтобы все роботы обновлялись на одном тике """
+    def __init__(self, periods, phases=None):
+        self.periods = np.asarray(periods, dtype=int).reshape(-1)
+        if (self.periods < 1).any():
+            raise ValueError("период управления должен быть не меньше одного тика")
+        if phases is None:
+            phases = self.staggered_phases(self.periods)
+        self.phases = np.asarray(phases, dtype=int).reshape(-1)
+        self.n_robots = len(self.periods)
+
+    @staticmethod
+    def staggered_phases(periods):
+        """ фазы роботов с одинаковым периодом p равномерно распределены по 0..p-1 """
+        phases = np.zeros(len(periods), dtype=int)
+        for p in np.unique(periods):
+            idx = np.flatnonzero(periods == p)
+            phases[idx] = np.arange(len(idx)) * p // len(idx)
+        return phases
+
+    @classmethod
+    def uniform(cls, n_robots, period, stagger=True):
+        """ один период на всех; stagger=False - все роботы на одном тике (period - 1, как счётчик в mission_*.py) """
+        periods = np.full(n_robots, period)
+        return cls(periods, None if stagger else periods - 1)
+
+    def due(self, tick):
+        """ флаги роботов (N,), которым положен шаг управления на тике tick """
+        return (tick - self.phases) % self.periods == 0
+
+    def load(self):
+        """ среднее и наибольшее число шагов управления на тик за общий период расписания """
+        cycle = math.lcm(*self.periods.tolist()) if self.n_robots else 1
+        counts = [int(self.due(t).sum()) for t in range(min(cycle, 100000))]
+        return float(np.mean(counts)), max(counts)
+
+
+class FixedStepClock:
+    """ фиксированный шаг физики dt независимо от частоты кадров: реальное время копится
+        и расходуется целыми шагами. speed > 1 - быстрее реального времени (несколько шагов на кадр);
+        отставание больше max_lag секунд реального времени отбрасывается, чтобы медленный кадр не копил долг """
+    def __init__(self, dt, speed=1.0, max_lag=0.25):
+        self.dt = dt
+        self.speed = speed
+        self.max_steps = max(1, math.ceil(max_lag * speed / dt))
+        self.accumulator = 0.0
+
+    def steps(self, elapsed):
+        """ число шагов физики за elapsed секунд реального времени """
+        self.accumulator += elapsed * self.speed
+        n = int(self.accumulator // self.dt)
+        if n > self.max_steps:
+            n = self.max_steps
+            self.accumulator %= self.dt
+        else:
+            self.accumulator -= n * self.dt
+        return n
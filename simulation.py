@@ -0,0 +1,424 @@
+import math, time
+import numpy as np
+
+from esn import Reservoir, EchoStateNetwork
+from fleet_esn import FleetESN
+from obstacle_set import ObstacleSet
+from profiling import profiler
+from scheduler import ControlScheduler
+from spatial_index import VerletPairs, nearest_points
+from vector_utils import batch_norm, batch_distance, pairwise_distance, batch_rotate
+
+CCD_PASSES = 8 # наибольшее число проверок перемещений за тик при ccd (см. Simulation._physics_ccd)
+PATIENCE = 60 # секунд модельного времени без новых целей, после которых прогон без max_steps останавливается
+
+
+def build_fleet(n_robots, n_reservoir=600, reservoir_seed=None, shared=False, dtype=np.float64):
+    """ флот ESN с параметрами robot_esn.Robot; shared=True - один резервуар на всех """
+    reservoir = None
+    if shared:
+        reservoir = Reservoir(n_reservoir, 8, spectral_radius=0.9, sparsity=0.3, leaking_rate=0.2,
+                              seed=reservoir_seed, dtype=dtype)
+    networks = [EchoStateNetwork(n_inputs=8, n_reservoir=n_reservoir, n_outputs=2, spectral_radius=0.9,
+                                 sparsity=0.3, leaking_rate=0.2, seed=reservoir_seed, reservoir=reservoir, dtype=dtype)
+                for _ in range(n_robots)]
+    return FleetESN(networks)
+
+
+class Simulation:
+    """ безоконная симуляция миссии: положения, скорости и цели всех роботов хранятся в массивах NumPy """
+    def __init__(self, data, robot="simple", n_reservoir=600, reservoir_seed=None, seed=None, shared=False,
+                 dtype=np.float64, scheduler=None, ccd=False, frozen=False, fleet=None, skin=None):
+        """ shared=True - все роботы с ESN используют один резервуар (память n^2 + N n вместо N n^2);
+            dtype - тип вычислений ESN; scheduler - расписание управления (scheduler.ControlScheduler),
+            по умолчанию все роботы управляются на одном тике раз в fps + 1 тиков, как в mission_simple.main;
+            ccd=True - непрерывная проверка столкновений (роботы доходят до касания, без туннелирования);
+            frozen=True - роботы с ESN без обучения (режим вывода, см. FleetESN.freeze);
+            fleet - готовый флот роботов с ESN (например, из checkpoint.load_fleet), вместо построения нового;
+            skin - запас списков соседей Верле (spatial_index.VerletPairs): пары роботов перебираются только
+            из списков, а не все N^2 (ближайший робот дальше списка ищется по кольцам ячеек,
+            см. spatial_index.nearest_points); None - без списков """
+        if robot not in ("simple", "esn"):
+            raise ValueError(f"неизвестный тип робота: {robot}")
+        self.robot = robot
+        self.ccd = ccd
+        self.data = data
+        self.size = np.array(data["size"], dtype=float)
+        self.fps = data["fps"]
+        self.dt = 1 / self.fps
+        self.radius = data["rsize"]
+        self.rng = np.random.default_rng(seed)
+
+        self.obstacles = ObstacleSet(rects=[[*pos, *size] for pos, size in data["obstacles"]])
+        robots = np.array(data["robots"], dtype=float).reshape(-1, 2, 2)
+        self.pos = robots[:, 0].copy()
+        self.target = robots[:, 1].copy()
+        self.n_robots = len(self.pos)
+
+        self.v0 = 100
+        self.vmax = 200
+        self.vel = self._random_velocity(self.n_robots)
+        self.collided = np.zeros(self.n_robots, dtype=bool) # 0 - free, 1 - collided
+
+        self.fleet = None
+        if robot == "esn":
+            if fleet is None:
+                fleet = build_fleet(self.n_robots, n_reservoir, reservoir_seed, shared, dtype)
+            elif fleet.n_robots != self.n_robots:
+                raise ValueError(f"во флоте {fleet.n_robots} сетей, а в миссии {self.n_robots} роботов")
+            self.fleet = fleet.freeze() if frozen else fleet
+        # радиус остановки у цели: у простых роботов r / 20, у роботов с ESN r / 10
+        self.stop_radius = self.radius / 20 if robot == "simple" else self.radius / 10
+
+        # признаки, предсказания ESN и награды последнего шага управления (для записи траекторий)
+        self.last_features = np.zeros((self.n_robots, 8))
+        self.last_prediction = np.zeros((self.n_robots, 2))
+        self.last_reward = np.zeros(self.n_robots)
+        self.controlled = np.zeros(self.n_robots, dtype=bool) # флаги управления на последнем тике
+
+        if scheduler is None:
+            scheduler = ControlScheduler.uniform(self.n_robots, self.fps + 1, stagger=False)
+        self.scheduler = scheduler
+        # радиус списков без запаса: касание роботов плюс перемещение обоих за тик с наибольшей скоростью
+        self.neighbours = None if skin is None else VerletPairs(skin, 2 * self.radius + 2 * self.vmax * self.dt)
+        self.ticks = 0
+        self.collisions = 0
+
+    @property
+    def time(self):
+        """ модельное время, с """
+        return self.ticks * self.dt
+
+    def _random_velocity(self, n):
+        a = self.rng.uniform(0, 2 * np.pi, n)
+        return batch_rotate(np.broadcast_to([self.v0, 0.0], (n, 2)), a)
+
+    def _limit_velocity(self):
+        """ ограничение скорости максимальным значением """
+        l = batch_norm(self.vel)[:, np.newaxis]
+        self.vel = np.where(l > self.vmax, self.vel / np.where(l > 0, l, 1) * self.vmax, self.vel)
+
+    def distance_to_target(self):
+        return batch_distance(self.pos, self.target)
+
+    def reached_target(self):
+        """ флаги достижения цели (как Robot.reached_target) """
+        return self.distance_to_target() < self.radius / 5
+
+    def goals_reached(self):
+        return int(self.reached_target().sum())
+
+    def robot_pairs(self, reach):
+        """ пары роботов (i, j) в обе стороны, среди которых есть все пары с расстоянием меньше reach;
+            None - списков соседей нет или они не покрывают reach (нужно проверять все пары) """
+        if self.neighbours is None:
+            return None
+        self.neighbours.refresh(self.pos)
+        if reach > self.neighbours.margin:
+            return None
+        return self.neighbours.directed()
+
+    def nearest_entity(self, idx=None):
+        """ координаты ближайшего объекта (препятствия, робота или стены) для роботов idx (по умолчанию - всех) """
+        with profiler.phase("nearest"):
+            return self._nearest_entity(np.arange(self.n_robots) if idx is None else idx)
+
+    def _nearest_entity(self, idx):
+        n, m, r = self.n_robots, len(idx), self.radius
+        pos = self.pos[idx]
+        x, y = pos[:, 0], pos[:, 1]
+
+        d_obs, _, p_obs = self.obstacles.query(pos)
+
+        p_wall = np.stack([
+            np.stack([np.full(m, r), y], axis=1),
+            np.stack([np.full(m, self.size[0] - r), y], axis=1),
+            np.stack([x, np.full(m, r)], axis=1),
+            np.stack([x, np.full(m, self.size[1] - r)], axis=1),
+        ], axis=1)
+        d_wall = batch_distance(pos[:, np.newaxis, :], p_wall)
+
+        pairs = self.robot_pairs(0)
+        if pairs is None:
+            return self._nearest_dense(idx, d_obs, p_obs, d_wall, p_wall)
+
+        """ ближайший из соседей по списку (при равенстве - с меньшим номером, как argmin по строке) """
+        row = np.full(n, -1)
+        row[idx] = np.arange(m)
+        i, j = pairs
+        keep = row[i] >= 0
+        i, j = i[keep], j[keep]
+        d = batch_distance(self.pos[i], self.pos[j]) - 2 * r
+        order = np.lexsort((j, d, i))
+        i, j, d = i[order], j[order], d[order]
+        start = np.flatnonzero(np.r_[True, i[1:] != i[:-1]]) if len(i) else np.zeros(0, dtype=int)
+        d_rob = np.full((m, 1), np.inf)
+        p_rob = np.zeros((m, 1, 2))
+        d_rob[row[i[start]], 0] = d[start]
+        p_rob[row[i[start]], 0] = self.pos[j[start]]
+
+        d = np.concatenate([d_obs, d_rob, d_wall], axis=1)
+        p = np.concatenate([p_obs, p_rob, p_wall], axis=1)
+        k = np.argmin(d, axis=1)
+        nearest = p[np.arange(m), k]
+        """ роботы вне списка дальше margin - 2r; если ближайшее найденное не ближе, ближайший робот строки
+            ищется по кольцам ячеек вокруг неё (только ближе уже найденного объекта) """
+        far = np.flatnonzero(d[np.arange(m), k] >= self.neighbours.margin - 2 * r)
+        if len(far):
+            d_near, j = nearest_points(self.pos, idx[far], self.neighbours.reach, d[far, k[far]] + 2 * r)
+            d_rob, p_rob = (d_near - 2 * r)[:, np.newaxis], self.pos[j][:, np.newaxis, :]
+            d = np.concatenate([d_obs[far], d_rob, d_wall[far]], axis=1)
+            p = np.concatenate([p_obs[far], p_rob, p_wall[far]], axis=1)
+            nearest[far] = p[np.arange(len(far)), np.argmin(d, axis=1)]
+        return nearest
+
+    def _nearest_dense(self, idx, d_obs, p_obs, d_wall, p_wall):
+        """ ближайшие объекты роботов idx с перебором всех роботов """
+        n, m = self.n_robots, len(idx)
+        d_rob = pairwise_distance(self.pos[idx], self.pos) - 2 * self.radius
+        d_rob[np.arange(m), idx] = np.inf
+        p_rob = np.broadcast_to(self.pos[np.newaxis, :, :], (m, n, 2))
+
+        # порядок перебора как в Robot._nearest_entity_position: препятствия, роботы, стены
+        d = np.concatenate([d_obs, d_rob, d_wall], axis=1)
+        p = np.concatenate([p_obs, p_rob, p_wall], axis=1)
+        return p[np.arange(m), np.argmin(d, axis=1)]
+
+    def features(self, idx=None):
+        """ нормализованные векторы признаков ESN роботов idx (по умолчанию - всех, (N, 8)) """
+        if idx is None:
+            idx = np.arange(self.n_robots)
+        nearest = self.nearest_entity(idx)
+        return np.concatenate([self.pos[idx] / self.size, self.target[idx] / self.size, self.vel[idx],
+                               nearest / self.size], axis=1)
+
+    def control(self, due=None):
+        """ обновление скоростей роботов, которым положен шаг управления (due), по умолчанию - всех """
+        if due is None:
+            due = np.ones(self.n_robots, dtype=bool)
+        done = due & (self.distance_to_target() < self.stop_radius)
+        active = due & ~done
+        if self.robot == "simple":
+            vel = np.where(self.collided[:, np.newaxis], self._random_velocity(self.n_robots), self.target - self.pos)
+            self.vel = np.where(active[:, np.newaxis], vel, self.vel)
+        elif active.any():
+            """ признаки считаются только для роботов с шагом управления, у остальных остаются прежние """
+            self.last_features[active] = self.features(np.flatnonzero(active))
+            prediction = self.fleet.predict(self.last_features, active)
+            self.last_prediction = np.where(active[:, np.newaxis], prediction, self.last_prediction)
+            self.last_reward = np.where(active, self.fleet.reward, self.last_reward)
+            self.vel = np.where(active[:, np.newaxis], prediction, self.vel)
+        self.vel[done] = 0
+        self._limit_velocity()
+
+    def impacts(self, disp):
+        """ доля перемещения disp (N, 2) каждого робота до первого касания стенки, препятствия или
+            другого робота (N,), np.inf - путь свободен (как Robot.time_of_impact). Роботы движутся одновременно,
+            поэтому пары проверяются по относительному движению - встречные роботы не проходят друг сквозь друга """
+        r, a, n = self.radius, self.pos, self.n_robots
+
+        # стенки: выход центра из прямоугольника [r, size - r]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(disp > 0, (self.size - r - a) / disp, np.where(disp < 0, (r - a) / disp, np.inf)).min(axis=1)
+        t = np.where(t <= 1, t, np.inf)
+        start = ((a < r) | (a > self.size - r)).any(axis=1)
+        end = ((a + disp < r) | (a + disp > self.size - r)).any(axis=1)
+        t = np.where(start, np.where(end, 0.0, np.inf), t)
+
+        t = np.minimum(t, self.obstacles.impacts(a, disp, r))
+        return np.minimum(t, self.robot_impacts(disp))
+
+    def robot_impacts(self, disp, moved=None):
+        """ доля перемещения disp (N, 2) каждого робота до касания другого робота (N,), np.inf - касания нет:
+            сближение центров до 2r при перемещении i относительно j на disp_i - disp_j.
+            moved - флаги роботов, перемещения которых изменились: проверяются только пары с ними """
+        r, a, n = self.radius, self.pos, self.n_robots
+        pairs = self.robot_pairs(2 * r + 2 * batch_norm(disp).max(initial=0))
+        if pairs is None:
+            rows = np.arange(n) if moved is None else np.flatnonzero(moved)
+            f = a[rows, np.newaxis, :] - a[np.newaxis, :, :]
+            s = self._contact(f, disp[rows, np.newaxis, :] - disp[np.newaxis, :, :])
+            s[np.arange(len(rows)), rows] = np.inf
+            t = np.full(n, np.inf)
+            t[rows] = s.min(axis=1, initial=np.inf)
+            """ касание симметрично: пары с роботами rows учитываются и для второго робота пары """
+            return np.minimum(t, s.min(axis=0, initial=np.inf))
+        i, j = pairs
+        if moved is not None:
+            keep = moved[i] | moved[j]
+            i, j = i[keep], j[keep]
+        s = self._contact(a[i] - a[j], disp[i] - disp[j])
+        t = np.full(n, np.inf)
+        np.minimum.at(t, i, s)
+        return t
+
+    def _contact(self, f, disp):
+        """ доля перемещения disp до касания (расстояние 2r) для смещений f между роботами
+            (f и disp - относительные), np.inf - касания нет """
+        r = self.radius
+        A = (disp ** 2).sum(axis=-1)
+        B = (f * disp).sum(axis=-1)
+        C = (f ** 2).sum(axis=-1) - (2 * r) ** 2
+        disc = B * B - A * C
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s = (-B - np.sqrt(np.maximum(disc, 0))) / A
+        s = np.where((A > 0) & (B < 0) & (C >= 0) & (disc >= 0) & (s <= 1), s, np.inf)
+        return np.where(C < 0, np.where(B < 0, 0.0, np.inf), s)
+
+    def physics(self):
+        """ перемещение всех роботов, отмена перемещений, приводящих к столкновению
+            (при ccd - перемещение до касания) """
+        r = self.radius
+        disp = self.dt * self.vel
+        new = self.pos + disp
+
+        arrived = np.zeros(self.n_robots, dtype=bool)
+        if self.robot == "esn":
+            """ робот с ESN, оказавшийся у цели, останавливается без проверки столкновений """
+            arrived = batch_distance(new, self.target) < self.radius / 10
+
+        if self.ccd:
+            self._physics_ccd(disp, new, arrived)
+            return
+
+        hit = ((new < r) | (new > self.size - r)).any(axis=1)
+        hit |= self.obstacles.collisions(new, r)
+
+        # столкновение с другими роботами проверяется и по старым, и по новым положениям
+        pairs = self.robot_pairs(2 * r + 2 * batch_norm(disp).max(initial=0))
+        for other in (self.pos, new):
+            hit |= self._touching(new, other, pairs)
+
+        hit &= ~arrived
+        self.vel[arrived] = 0
+        self.collided = hit
+        self.collisions += int(hit.sum())
+        self.pos = np.where(hit[:, np.newaxis], self.pos, new)
+
+    def _physics_ccd(self, disp, new, arrived):
+        l = batch_norm(disp)
+        scale = np.ones(self.n_robots)
+        contact = np.zeros(self.n_robots, dtype=bool)
+        """ перемещаемся до касания (с зазором 1e-6, чтобы не оказаться внутри из-за округления), а перемещение,
+            конечное положение которого пересекается со стенкой, препятствием или другим роботом, отменяем.
+            Робот, остановленный раньше, чем рассчитывал его сосед, может оказаться у соседа на пути, поэтому
+            проверка повторяется, пока перемещения меняются (не больше CCD_PASSES раз). Укороченный путь -
+            начало прежнего, поэтому стенки и препятствия проверяются один раз, а дальше - только пары роботов,
+            перемещения которых изменились """
+        t = self.impacts(disp)
+        changed = None # на первом проходе положения изменились у всех
+        for _ in range(CCD_PASSES):
+            step = scale * l
+            shrink = (t <= 1) & ~arrived
+            new_scale = np.where(shrink, scale * np.clip(t - 1e-6 / np.where(step > 0, step, 1), 0, 1), scale)
+            if changed is not None:
+                changed = new_scale != scale
+            revert = self._overlapping(self.pos + new_scale[:, np.newaxis] * disp, disp, changed)
+            revert &= ~arrived & (new_scale > 0)
+            new_scale[revert] = 0
+            contact |= shrink | revert
+            changed = new_scale != scale
+            scale = new_scale
+            if not changed.any():
+                revert = np.zeros(self.n_robots, dtype=bool)
+                break
+            t = self.robot_impacts(scale[:, np.newaxis] * disp, changed)
+        else:
+            """ проверки не сошлись за CCD_PASSES раз - оставшиеся пересечения отменяются """
+            revert = self._overlapping(self.pos + scale[:, np.newaxis] * disp, disp) & ~arrived
+        new = np.where(contact[:, np.newaxis], self.pos + scale[:, np.newaxis] * disp, new)
+
+        hit = contact | revert
+        self.vel[arrived] = 0
+        self.collided = hit
+        self.collisions += int(hit.sum())
+        self.pos = np.where(revert[:, np.newaxis], self.pos, new)
+
+    def _overlapping(self, new, disp, changed=None):
+        """ флаги роботов, положение new которых пересекается со стенкой, препятствием или новым положением
+            другого робота (роботы движутся одновременно); changed - флаги роботов, положения которых изменились
+            с прошлой проверки: проверяются только они и пары с ними (пересечение отмечается у обоих роботов) """
+        r, n = self.radius, self.n_robots
+        rows = np.arange(n) if changed is None else np.flatnonzero(changed)
+        overlap = np.zeros(n, dtype=bool)
+        p = new[rows]
+        overlap[rows] = ((p < r) | (p > self.size - r)).any(axis=1) | self.obstacles.collisions(p, r)
+        pairs = self.robot_pairs(2 * r + 2 * batch_norm(disp).max(initial=0))
+        if pairs is None:
+            touch = pairwise_distance(p, new) < 2 * r
+            touch[np.arange(len(rows)), rows] = False
+            overlap[rows] |= touch.any(axis=1)
+            return overlap | touch.any(axis=0)
+        i, j = pairs
+        if changed is not None:
+            keep = changed[i] | changed[j]
+            i, j = i[keep], j[keep]
+        overlap[i[batch_distance(new[i], new[j]) < 2 * r]] = True
+        return overlap
+
+    def _touching(self, new, other, pairs):
+        """ флаги роботов (N,), положение new которых ближе 2r к положению other другого робота;
+            pairs - пары из robot_pairs или None (проверяются все пары) """
+        if pairs is None:
+            d = pairwise_distance(new, other)
+            d[np.arange(self.n_robots), np.arange(self.n_robots)] = np.inf
+            return (d < 2 * self.radius).any(axis=1)
+        i, j = pairs
+        touching = np.zeros(self.n_robots, dtype=bool)
+        touching[i[batch_distance(new[i], other[j]) < 2 * self.radius]] = True
+        return touching
+
+    def step(self):
+        """ один тик: управление роботов по расписанию scheduler, перемещение на каждом тике """
+        self.controlled = self.scheduler.due(self.ticks)
+        if self.controlled.any():
+            with profiler.phase("control"):
+                self.control(self.controlled)
+        with profiler.phase("physics"):
+            self.physics()
+        self.ticks += 1
+
+    def run(self, max_steps=None, until_done=True, on_tick=None, patience=None):
+        """ прогон симуляции на max_steps тиков и/или до достижения всех целей; возвращает метрики.
+            patience - остановка после стольких тиков подряд без новых достигнутых целей
+            (при max_steps=None по умолчанию - PATIENCE секунд модельного времени, чтобы прогон,
+            в котором роботы застряли, не шёл бесконечно). on_tick(sim) вызывается после каждого тика
+            (например, Recorder.record) """
+        if patience is None and max_steps is None:
+            patience = math.ceil(PATIENCE * self.fps)
+        start = time.perf_counter()
+        best, last_goal = self.goals_reached(), self.ticks
+        while max_steps is None or self.ticks < max_steps:
+            if until_done and self.reached_target().all():
+                break
+            if patience is not None and self.ticks - last_goal >= patience:
+                break
+            self.step()
+            if on_tick is not None:
+                on_tick(self)
+            profiler.tick()
+            if patience is not None:
+                goals = self.goals_reached()
+                if goals > best:
+                    best, last_goal = goals, self.ticks
+        return self.metrics(time.perf_counter() - start)
+
+    def metrics(self, wall_time=0.0):
+        goals = self.goals_reached()
+        return {
+            "robots": self.n_robots,
+            "ticks": self.ticks,
+            "sim_time": self.time,
+            "wall_time": wall_time,
+            "goals_reached": goals,
+            "efficiency": goals / self.time if self.ticks else 0.0,
+            "collisions": self.collisions,
+            **self.neighbour_metrics(),
+        }
+
+    def neighbour_metrics(self):
+        """ перестроения списков соседей Верле и их число на тик (пусто без списков) """
+        if self.neighbours is None:
+            return {}
+        rebuilds = self.neighbours.rebuilds
+        return {"neighbour_rebuilds": rebuilds, "rebuild_rate": rebuilds / self.ticks if self.ticks else 0.0}
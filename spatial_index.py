@@ -0,0 +1,380 @@
+import math
+from collections import defaultdict
+import numpy as np
+from obstacle_set import ObstacleSet
+from vector_utils import distance, batch_distance
+
+
+def obstacle_cells(rects, cell_size):
+    """ индекс препятствий (M, 4) для сетки с ячейкой cell_size: строки (i, j, номер препятствия)
+        для всех покрываемых ячеек, в порядке номеров препятствий (можно сохранить и передать в SpatialGrid) """
+    rows = []
+    for k, (x, y, w, h) in enumerate(np.asarray(rects, dtype=float).reshape(-1, 4)):
+        i0, j0 = math.floor(x / cell_size), math.floor(y / cell_size)
+        i1, j1 = math.floor((x + w) / cell_size), math.floor((y + h) / cell_size)
+        ci, cj = np.meshgrid(np.arange(i0, i1 + 1), np.arange(j0, j1 + 1), indexing="ij")
+        rows.append(np.stack([ci.ravel(), cj.ravel(), np.full(ci.size, k)], axis=1))
+    return np.concatenate(rows).astype(np.int64) if rows else np.zeros((0, 3), dtype=np.int64)
+
+
+class SpatialGrid:
+    """ равномерная сетка для запросов столкновений и ближайших объектов;
+        препятствия регистрируются номерами во всех покрываемых ячейках, роботы - в ячейке центра.
+        Если препятствия переданы набором ObstacleSet, кандидаты из препятствий возвращаются его подмножеством
+        и проверяются векторным ядром набора, иначе - списком Obstacle """
+    def __init__(self, cell_size, obstacles=(), robots=(), others=(), cells=None):
+        """ cells - готовый индекс препятствий (см. obstacle_cells) для той же ячейки, например из кэша сценария """
+        self.cell = cell_size
+        self.vectorised = isinstance(obstacles, ObstacleSet)
+        self.obstacles = obstacles if self.vectorised else list(obstacles)
+        if self.vectorised:
+            self.rects = obstacles.rects
+        else:
+            self.rects = np.array([[*ob.pos, *ob.size] for ob in self.obstacles], dtype=float).reshape(-1, 4)
+        self.subsets = {}                    # номера препятствий -> их подмножество набора (препятствия неподвижны)
+        self.cells = defaultdict(list)       # ячейка -> номера препятствий
+        self.robot_cells = defaultdict(list) # ячейка -> роботы
+        self.keys = {}    # робот -> ячейка центра
+        self.order = {}   # робот -> порядок перебора
+        self.others = list(others) # объекты вне сетки (комната), проверяются всегда
+        self.max_radius = 0
+        self.bounds = None # диапазон занятых ячеек (i0, j0, i1, j1)
+
+        if cells is None:
+            cells = obstacle_cells(self.rects, cell_size)
+        for ci, cj, i in cells.tolist():
+            self.cells[(ci, cj)].append(i)
+        if len(cells):
+            lo, hi = cells[:, :2].min(axis=0), cells[:, :2].max(axis=0)
+            self._extend(int(lo[0]), int(lo[1]), int(hi[0]), int(hi[1]))
+
+        for i, rob in enumerate(robots):
+            self.order[rob] = i
+            self.max_radius = max(self.max_radius, rob.radius)
+            key = self._key(rob.pos)
+            self.keys[rob] = key
+            self.robot_cells[key].append(rob)
+            self._extend(*key, *key)
+
+    def _key(self, p):
+        return math.floor(p[0] / self.cell), math.floor(p[1] / self.cell)
+
+    def _extend(self, i0, j0, i1, j1):
+        if self.bounds is None:
+            self.bounds = (i0, j0, i1, j1)
+            return
+        b = self.bounds
+        self.bounds = (min(b[0], i0), min(b[1], j0), max(b[2], i1), max(b[3], j1))
+
+    def update(self, rob):
+        """ перенос робота в ячейку его текущего положения """
+        key = self._key(rob.pos)
+        old = self.keys[rob]
+        if key == old:
+            return
+        self.robot_cells[old].remove(rob)
+        self.robot_cells[key].append(rob)
+        self.keys[rob] = key
+        self._extend(*key, *key)
+
+    def _box(self, i0, j0, i1, j1):
+        """ номера препятствий и роботы из прямоугольника ячеек, без повторов """
+        obstacles, robots = {}, {}
+        for ci in range(i0, i1 + 1):
+            for cj in range(j0, j1 + 1):
+                for i in self.cells.get((ci, cj), ()):
+                    obstacles[i] = None
+                for rob in self.robot_cells.get((ci, cj), ()):
+                    robots[rob] = None
+        return list(obstacles), list(robots)
+
+    def _select(self, idx):
+        """ препятствия с номерами idx: подмножество ObstacleSet или список Obstacle """
+        if self.vectorised:
+            key = tuple(idx)
+            if key not in self.subsets:
+                self.subsets[key] = self.obstacles.subset(idx)
+            return self.subsets[key]
+        return [self.obstacles[i] for i in idx]
+
+    def _candidates(self, idx):
+        """ препятствия с номерами idx для перебора объектов (подмножество набора - одним объектом) """
+        if self.vectorised:
+            return [self._select(idx)] if len(idx) else []
+        return [self.obstacles[i] for i in idx]
+
+    def _distances(self, idx, pos):
+        """ расстояния от точки pos до препятствий с номерами idx (как Obstacle.dist) """
+        if not len(idx):
+            return []
+        if self.vectorised:
+            return self._select(idx).query((pos,))[0][0].tolist()
+        return [self.obstacles[i].dist(pos) for i in idx]
+
+    def collision_candidates(self, pos, radius, rob=None):
+        """ объекты, с которыми может столкнуться робот радиуса radius в точке pos
+            (rob - сам робот; сетке не нужен, используется списками соседей NeighbourList) """
+        reach = radius + self.max_radius
+        i0, j0 = self._key((pos[0] - reach, pos[1] - reach))
+        i1, j1 = self._key((pos[0] + reach, pos[1] + reach))
+        obstacles, robots = self._box(i0, j0, i1, j1)
+        return self.others + self._candidates(obstacles) + robots
+
+    def nearest_candidates(self, rob, limit=float('inf')):
+        """ препятствия и роботы, среди которых гарантированно находится ближайший к rob объект
+            (в порядке исходных списков); limit - уже известное расстояние (например, до стен) """
+        if self.bounds is None:
+            return self._select([]), []
+        ci, cj = self._key(rob.pos)
+        x, y = rob.pos
+        best = limit
+        seen_obstacles, seen_robots = {}, {}
+        k = 0
+        while True:
+            obstacles, robots = self._box(ci - k, cj - k, ci + k, cj + k)
+            new = [i for i in obstacles if i not in seen_obstacles]
+            for i, d in zip(new, self._distances(new, rob.pos)):
+                seen_obstacles[i] = d
+                best = min(best, d)
+            for other in robots:
+                if other in seen_robots or other is rob:
+                    continue
+                d = distance(rob.pos, other.pos) - other.radius - rob.radius
+                seen_robots[other] = d
+                best = min(best, d)
+
+            # объекты вне просмотренного квадрата не ближе его границы
+            lo_x, lo_y = (ci - k) * self.cell, (cj - k) * self.cell
+            hi_x, hi_y = (ci + k + 1) * self.cell, (cj + k + 1) * self.cell
+            gap = min(x - lo_x, hi_x - x, y - lo_y, hi_y - y)
+            b = self.bounds
+            covered = ci - k <= b[0] and cj - k <= b[1] and ci + k >= b[2] and cj + k >= b[3]
+            if covered or best < gap - self.max_radius - rob.radius:
+                break
+            k += 1
+
+        obstacles = sorted(i for i, d in seen_obstacles.items() if d <= best)
+        robots = sorted((other for other, d in seen_robots.items() if d <= best), key=self.order.get)
+        return self._select(obstacles), robots
+
+
+
+def close_pairs(pos, reach):
+    """ пары (i, j) точек pos (N, 2) с расстоянием не больше reach, каждая пара - один раз.
+        Хеш-сетка с ячейкой reach: точки сортируются по номеру ячейки, соседние ячейки находятся двоичным поиском """
+    pos = np.asarray(pos, dtype=float).reshape(-1, 2)
+    n = len(pos)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    cells = np.floor(pos / reach).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    width = int(cells[:, 1].max()) + 2
+    code = cells[:, 0] * width + cells[:, 1]
+    order = np.argsort(code, kind="stable")
+    sorted_code = code[order]
+
+    first, second = [], []
+    # своя ячейка и половина соседних - каждая пара ячеек просматривается один раз
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        target = code + dx * width + dy
+        lo = np.searchsorted(sorted_code, target, "left")
+        count = np.searchsorted(sorted_code, target, "right") - lo
+        i = np.repeat(np.arange(n), count)
+        k = np.arange(len(i)) - np.repeat(np.cumsum(count) - count, count)
+        j = order[np.repeat(lo, count) + k]
+        if dx == dy == 0:
+            i, j = i[i < j], j[i < j]
+        first.append(i)
+        second.append(j)
+    i, j = np.concatenate(first), np.concatenate(second)
+    keep = batch_distance(pos[i], pos[j]) <= reach
+    return i[keep], j[keep]
+
+
+def nearest_points(pos, idx, cell, bound=None):
+    """ для точек pos[idx]: расстояние до ближайшей другой точки pos (N, 2) и её номер (при равенстве - меньший;
+        -1 и np.inf, если ближе bound никого нет). Поиск по кольцам ячеек размера cell вокруг ячейки точки:
+        после колец 0..k непросмотренные точки не ближе k * cell, поэтому строка заканчивается, как только
+        найденное расстояние (или bound - уже известное расстояние до другого объекта) меньше этой границы """
+    pos = np.asarray(pos, dtype=float).reshape(-1, 2)
+    idx = np.asarray(idx, dtype=np.int64)
+    m = len(idx)
+    best_d, best_j = np.full(m, np.inf), np.full(m, -1, dtype=np.int64)
+    if not m or len(pos) < 2:
+        return best_d, best_j
+    bound = np.full(m, np.inf) if bound is None else np.asarray(bound, dtype=float)
+    cells = np.floor(pos / cell).astype(np.int64)
+    cells -= cells.min(axis=0)
+    width = cells.max(axis=0) + 1
+    code = cells[:, 0] * width[1] + cells[:, 1]
+    order = np.argsort(code, kind="stable")
+    sorted_code = code[order]
+    home = cells[idx]
+
+    todo = np.arange(m)
+    k = 0
+    while len(todo) and k <= width.max():
+        ring = [(dx, dy) for dx in range(-k, k + 1) for dy in range(-k, k + 1) if max(abs(dx), abs(dy)) == k]
+        for dx, dy in ring:
+            tx, ty = home[todo, 0] + dx, home[todo, 1] + dy
+            valid = (tx >= 0) & (tx < width[0]) & (ty >= 0) & (ty < width[1])
+            rows = todo[valid]
+            target = tx[valid] * width[1] + ty[valid]
+            lo = np.searchsorted(sorted_code, target, "left")
+            count = np.searchsorted(sorted_code, target, "right") - lo
+            row = np.repeat(rows, count)
+            offset = np.arange(len(row)) - np.repeat(np.cumsum(count) - count, count)
+            j = order[np.repeat(lo, count) + offset]
+            keep = j != idx[row]
+            row, j = row[keep], j[keep]
+            if not len(row):
+                continue
+            d = batch_distance(pos[idx[row]], pos[j])
+            first = np.lexsort((j, d, row))
+            row, j, d = row[first], j[first], d[first]
+            start = np.flatnonzero(np.r_[True, row[1:] != row[:-1]])
+            row, j, d = row[start], j[start], d[start]
+            better = (d < best_d[row]) | ((d == best_d[row]) & (j < best_j[row]))
+            best_d[row[better]], best_j[row[better]] = d[better], j[better]
+        # зазор 1e-9 - чтобы округление не завершило строку раньше точки на самой границе
+        done = np.minimum(best_d[todo], bound[todo]) < k * cell - 1e-9
+        todo = todo[~done]
+        k += 1
+    return best_d, best_j
+
+
+class VerletPairs:
+    """ списки соседей Верле для векторизованного ядра (Simulation): пары роботов не дальше cutoff + skin.
+        Пары перестраиваются, когда какой-либо робот сместился больше чем на skin / 2 от положения при построении;
+        до этого любая пара вне списка дальше margin = cutoff, поэтому запросы на расстояниях меньше margin
+        достаточно проверять только по парам из списка """
+    def __init__(self, skin, cutoff):
+        self.skin = skin
+        self.reach = cutoff + skin
+        self.origin = None
+        self.first = self.second = np.zeros(0, dtype=np.int64)
+        self.rebuilds = 0
+
+    @property
+    def margin(self):
+        return self.reach - self.skin
+
+    def refresh(self, pos):
+        """ перестроение пар по положениям pos (N, 2), если это нужно; True - пары перестроены """
+        if self.origin is not None and len(pos) == len(self.origin) \
+                and (batch_distance(pos, self.origin) <= self.skin / 2).all():
+            return False
+        self.first, self.second = close_pairs(pos, self.reach)
+        self.origin = np.array(pos, dtype=float)
+        self.rebuilds += 1
+        return True
+
+    def directed(self):
+        """ пары в обе стороны: (i, j) и (j, i) """
+        return np.concatenate([self.first, self.second]), np.concatenate([self.second, self.first])
+
+
+class NeighbourList:
+    """ списки соседей Верле поверх SpatialGrid (тот же интерфейс, передаётся вместо сетки).
+        Для каждого робота хранятся препятствия и роботы ближе cutoff + skin. Списки перестраиваются все сразу,
+        когда какой-либо робот сместился больше чем на skin / 2 от положения при построении, поэтому объект
+        вне списка за время его жизни не подходит к роботу ближе cutoff и большинство тиков перебирает только
+        соседей из списка. Запрос, который список не покрывает (например, ближайший объект дальше cutoff),
+        передаётся сетке, так что результаты совпадают с полным перебором.
+        skin должен быть больше удвоенного перемещения робота за тик, иначе списки перестраиваются почти
+        после каждого перемещения """
+    def __init__(self, grid, skin, cutoff=None):
+        """ cutoff - радиус списков без запаса (по умолчанию 1.5 наибольших радиуса робота - хватает
+            для проверок столкновений при перемещении за тик не больше половины радиуса) """
+        self.grid = grid
+        self.skin = skin
+        self.reach = (1.5 * grid.max_radius if cutoff is None else cutoff) + skin
+        self.robots = sorted(grid.order, key=grid.order.get)
+        self.members = np.empty(len(self.robots), dtype=object) # роботы в порядке перебора сетки
+        self.members[:] = self.robots
+        self.rects = grid.rects
+        self.radii = np.array([rob.radius for rob in self.robots], dtype=float)
+        self.lists = {}      # робот -> номера препятствий и роботы-соседи в порядке перебора сетки
+        self.candidates = {} # робот -> соседи для проверок столкновений (как SpatialGrid.collision_candidates)
+        self.origin = {}     # робот -> положение при построении списков
+        self.rebuilds = 0
+        self.updates = 0
+        self.queries = 0
+        self.fallbacks = 0
+        self.rebuild()
+        self.rebuilds = 0 # начальное построение не считается
+
+    def rebuild(self):
+        """ построение списков всех роботов по текущим положениям (векторно: пары роботов - close_pairs,
+            препятствия - расстояния до всех прямоугольников) """
+        n = len(self.robots)
+        if not n:
+            return
+        pos = np.array([rob.pos for rob in self.robots], dtype=float)
+        # зазор 1e-9 - чтобы округление не исключило объект на самой границе радиуса
+        reach = self.reach + 1e-9
+
+        p = pos[:, np.newaxis, :]
+        lo = self.rects[np.newaxis, :, 0:2]
+        gap = batch_distance(p, np.clip(p, lo, lo + self.rects[np.newaxis, :, 2:4])) # 0 внутри препятствия
+        rob_o, ob = np.nonzero(gap <= reach) # уже упорядочены по роботу, затем по препятствию
+        bounds_o = np.searchsorted(rob_o, np.arange(n + 1))
+
+        i, j = close_pairs(pos, reach + self.radii.max())
+        d = batch_distance(pos[i], pos[j])
+        near_j, near_i = d - self.radii[j] <= reach, d - self.radii[i] <= reach
+        owner = np.concatenate([i[near_j], j[near_i]])
+        other = np.concatenate([j[near_j], i[near_i]])
+        order = np.lexsort((other, owner))
+        owner, other = owner[order], other[order]
+        bounds_r = np.searchsorted(owner, np.arange(n + 1))
+
+        for k, rob in enumerate(self.robots):
+            idx = ob[bounds_o[k]:bounds_o[k + 1]].tolist()
+            robots = self.members[other[bounds_r[k]:bounds_r[k + 1]]].tolist()
+            self.lists[rob] = idx, robots
+            self.candidates[rob] = self.grid._candidates(idx) + robots
+            self.origin[rob] = rob.pos
+        self.rebuilds += 1
+
+    def _slack(self, rob, pos):
+        """ на сколько объекты вне списка rob могли приблизиться к точке pos: смещение pos от положения
+            при построении и смещение других роботов (не больше skin / 2) """
+        return distance(pos, self.origin[rob]) + self.skin / 2
+
+    def update(self, rob):
+        """ перенос робота в сетке; перестроение списков, если он сместился больше чем на skin / 2 """
+        self.grid.update(rob)
+        self.updates += 1
+        if distance(rob.pos, self.origin[rob]) > self.skin / 2:
+            self.rebuild()
+
+    def collision_candidates(self, pos, radius, rob=None):
+        """ объекты, с которыми может столкнуться робот rob радиуса radius в точке pos """
+        self.queries += 1
+        if rob in self.lists and radius + self._slack(rob, pos) <= self.reach:
+            return self.grid.others + self.candidates[rob]
+        self.fallbacks += 1
+        return self.grid.collision_candidates(pos, radius, rob)
+
+    def nearest_candidates(self, rob, limit=float('inf')):
+        """ как SpatialGrid.nearest_candidates, но, если ближайший объект в пределах списка, - только по списку """
+        self.queries += 1
+        if rob in self.lists:
+            idx, robots = self.lists[rob]
+            obstacle_dist = self.grid._distances(idx, rob.pos)
+            robot_dist = [distance(rob.pos, other.pos) - other.radius - rob.radius for other in robots]
+            best = min([limit, *obstacle_dist, *robot_dist])
+            if best + rob.radius + self._slack(rob, rob.pos) < self.reach:
+                return (self.grid._select([i for i, d in zip(idx, obstacle_dist) if d <= best]),
+                        [other for other, d in zip(robots, robot_dist) if d <= best])
+        self.fallbacks += 1
+        return self.grid.nearest_candidates(rob, limit)
+
+    def stats(self):
+        """ перестроений списков на тик (тик - по одному update на робота) и доля запросов, переданных сетке """
+        ticks = self.updates / len(self.robots) if self.robots else 0
+        return {"rebuilds": self.rebuilds,
+                "rebuild_rate": self.rebuilds / ticks if ticks else 0.0,
+                "fallback_rate": self.fallbacks / self.queries if self.queries else 0.0}
+
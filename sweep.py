@@ -0,0 +1,215 @@
+import csv, itertools, math, time
+from pathlib import Path
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from esn import Reservoir, EchoStateNetwork
+from fleet_esn import FleetESN
+from simulation import Simulation
+from scenarios import load_mission
+from missions import mission_circle, mission_circle_hole
+
+# Подбор параметров резервуара роботов с ESN на безоконных эпизодах.
+# Конфигурация - словарь с ключами PARAMS; пространство поиска - словарь "параметр -> значения":
+# список - перебор (grid) или случайный выбор (random), пара (lo, hi) - равномерное распределение
+# (целое, если обе границы целые). Качество конфигурации - достигнутые цели на секунду модельного времени.
+
+PARAMS = ("n_reservoir", "spectral_radius", "sparsity", "leaking_rate")
+DEFAULTS = {"n_reservoir": 600, "spectral_radius": 0.9, "sparsity": 0.3, "leaking_rate": 0.2} # как в robot_esn.Robot
+SPACE = {
+    "n_reservoir": [200, 400, 600],
+    "spectral_radius": [0.7, 0.9, 1.1],
+    "sparsity": [0.1, 0.3, 0.5],
+    "leaking_rate": [0.1, 0.2, 0.4, 0.6],
+}
+COLUMNS = ("rank", *PARAMS, "score", "goals_reached", "sim_time", "ticks", "budget", "pruned", "wall_time")
+N_INPUTS = 8 # признаков робота (см. robot_esn.Robot.features)
+
+_reservoirs = {} # (n, n_inputs, radius, sparsity, seed, dtype) -> (W_in, W) в памяти процесса
+
+
+def grid(space):
+    """ все сочетания значений пространства space (у параметров, которых нет в space, - значения DEFAULTS) """
+    space = {k: v if isinstance(v, list) else [v] for k, v in {**DEFAULTS, **space}.items()}
+    return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+
+def sample(space, n, rng=None):
+    """ n случайных конфигураций из пространства space """
+    rng = np.random.default_rng(rng)
+    space = {**DEFAULTS, **space}
+    configs = []
+    for _ in range(n):
+        config = {}
+        for k, v in space.items():
+            if isinstance(v, list):
+                config[k] = v[rng.integers(len(v))]
+            elif isinstance(v, tuple):
+                lo, hi = v
+                config[k] = int(rng.integers(lo, hi + 1)) if type(lo) == type(hi) == int else float(rng.uniform(lo, hi))
+            else:
+                config[k] = v
+        configs.append(config)
+    return configs
+
+
+def _key(config, seed, dtype=np.float64):
+    return (int(config["n_reservoir"]), N_INPUTS, float(config["spectral_radius"]), float(config["sparsity"]), seed,
+            np.dtype(dtype).name)
+
+
+def cached_weights(key, cache_dir=".reservoirs"):
+    """ веса W_in, W резервуара с ключом (размер, число входов, спектральный радиус, разреженность, seed, тип):
+        из памяти процесса, из файла в cache_dir или построенные заново. Веса не зависят от leaking_rate, поэтому
+        конфигурации, отличающиеся только им, используют один резервуар """
+    if key in _reservoirs:
+        return _reservoirs[key]
+    n, n_inputs, radius, sparsity, seed, dtype = key
+    path = Path(cache_dir) / f"reservoir-{n}-{n_inputs}-{radius}-{sparsity}-{seed}-{dtype}.npz"
+    if path.exists():
+        with np.load(path) as f:
+            weights = f["W_in"], f["W"]
+    else:
+        res = Reservoir(n, n_inputs, radius, sparsity, seed=seed, dtype=dtype)
+        weights = res.W_in, res.W
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(tmp, W_in=res.W_in, W=res.W)
+        tmp.replace(path)
+    for w in weights:
+        w.setflags(write=False)
+    _reservoirs[key] = weights
+    return weights
+
+
+def build_trial_fleet(config, n_robots, rng, reservoir_seed=0, cache_dir=".reservoirs", dtype=np.float64):
+    """ флот с общим резервуаром конфигурации config и начальным W_out из генератора rng
+        (глобальный np.random не используется, поэтому испытания воспроизводимы и в разных процессах) """
+    W_in, W = cached_weights(_key(config, reservoir_seed, dtype), cache_dir)
+    reservoir = Reservoir.from_weights(W_in, W, config["leaking_rate"], reservoir_seed)
+    shape = (2, reservoir.n_reservoir + 1)
+    """ у каждой сети свой резервуар (clone): веса общие, а состояние и буферы - свои """
+    networks = [EchoStateNetwork.from_weights(reservoir.clone(),
+                                              (rng.standard_normal(shape) * 0.1).astype(reservoir.dtype))
+                for _ in range(n_robots)]
+    return FleetESN(networks)
+
+
+def run_trial(args):
+    """ испытание конфигурации: эпизоды по max_steps тиков с генераторами из seeds (по одному на эпизод).
+        Если prune_at задан, эпизод, у которого после доли prune_at тиков качество не выше min_score,
+        останавливается, а испытание считается отсечённым (остальные эпизоды не запускаются) """
+    data, config, max_steps, seeds, prune_at, min_score, reservoir_seed, cache_dir, dtype = args
+    start = time.perf_counter()
+    goals, sim_time, ticks, pruned = 0, 0.0, 0, False
+    for s in seeds:
+        rng = np.random.default_rng(s)
+        fleet = build_trial_fleet(config, len(data["robots"]), rng, reservoir_seed, cache_dir, dtype)
+        sim = Simulation(data, "esn", seed=rng, fleet=fleet)
+        if prune_at is not None:
+            metrics = sim.run(int(max_steps * prune_at))
+            pruned = metrics["efficiency"] <= min_score and not sim.reached_target().all()
+        if not pruned:
+            metrics = sim.run(max_steps)
+        goals += metrics["goals_reached"]
+        sim_time += metrics["sim_time"]
+        ticks += metrics["ticks"]
+        if pruned:
+            break
+    return {**config,
+            "score": goals / sim_time if sim_time else 0.0,
+            "goals_reached": goals,
+            "sim_time": sim_time,
+            "ticks": ticks,
+            "budget": max_steps,
+            "pruned": pruned,
+            "wall_time": time.perf_counter() - start}
+
+
+def _trial_seeds(seed, trial, episodes):
+    return np.random.SeedSequence([seed, trial]).spawn(episodes)
+
+
+def _rank(records):
+    """ сначала конфигурации с большим бюджетом и не отсечённые, среди них - по убыванию качества """
+    records = sorted(records, key=lambda r: (-r["budget"], r["pruned"], -r["score"]))
+    for i, r in enumerate(records):
+        r["rank"] = i + 1
+    return records
+
+
+def sweep(mission, search="grid", space=None, n_trials=20, episodes=2, max_steps=1800, min_steps=200, eta=3,
+          prune_at=0.5, min_score=0.0, workers=None, seed=0, reservoir_seed=0, cache_dir=".reservoirs",
+          dtype=np.float64, output=None, report=print):
+    """ подбор параметров резервуара (PARAMS) на миссии mission (генератор из missions.py или имя json-файла).
+        search: "grid" - все сочетания space, "random" - n_trials случайных конфигураций,
+        "halving" - последовательное деление пополам (successive halving) n_trials случайных конфигураций:
+        все испытываются на min_steps тиках, лучшая 1/eta часть - на бюджете в eta раз больше, и так до max_steps.
+        В grid и random слабые испытания отсекаются досрочно (prune_at, min_score - см. run_trial; prune_at=None -
+        без отсечения). У каждого испытания свои генераторы из SeedSequence([seed, номер испытания]).
+        dtype - тип вычислений ESN (веса в cache_dir хранятся отдельно для каждого типа).
+        Возвращает записи, упорядоченные по качеству; output - путь к csv-таблице результатов """
+    data = load_mission(mission)
+    space = SPACE if space is None else space
+    if search == "grid":
+        configs = grid(space)
+    elif search in ("random", "halving"):
+        configs = sample(space, n_trials, np.random.default_rng([seed, 1]))
+    else:
+        raise ValueError(f"неизвестный способ поиска: {search}")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        """ резервуары строятся заранее, по одному на ключ, чтобы процессы не строили одни и те же веса """
+        keys = sorted({_key(c, reservoir_seed, dtype) for c in configs})
+        list(pool.map(cached_weights, keys, [cache_dir] * len(keys)))
+
+        def run(trials, budget, prune):
+            tasks = [(data, configs[t], budget, _trial_seeds(seed, t, episodes), prune, min_score,
+                      reservoir_seed, cache_dir, dtype) for t in trials]
+            return dict(zip(trials, pool.map(run_trial, tasks)))
+
+        if search != "halving":
+            results = run(range(len(configs)), max_steps, prune_at)
+        else:
+            rungs = max(0, math.floor(math.log(max_steps / min_steps, eta)))
+            results = {}
+            trials = list(range(len(configs)))
+            for k in range(rungs, -1, -1):
+                budget = max(1, round(max_steps / eta ** k))
+                rung = run(trials, budget, None)
+                results.update(rung)
+                if report is not None:
+                    report({"budget": budget, "trials": len(trials),
+                            "best_score": max(r["score"] for r in rung.values())})
+                trials = sorted(trials, key=lambda t: -rung[t]["score"])[:max(1, math.ceil(len(trials) / eta))]
+            for t, r in results.items():
+                r["pruned"] = r["budget"] < max_steps
+
+    records = _rank(list(results.values()))
+    if output is not None:
+        write_table(output, records)
+    if report is not None:
+        report(table(records[:10]))
+    return records
+
+
+def write_table(path, records):
+    """ csv-таблица результатов (столбцы COLUMNS) """
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def table(records):
+    """ текстовая таблица результатов """
+    rows = [[f"{r[c]:.4g}" if isinstance(r[c], float) else str(r[c]) for c in COLUMNS] for r in records]
+    widths = [max(len(c), *(len(row[i]) for row in rows)) for i, c in enumerate(COLUMNS)]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(COLUMNS, widths))]
+    lines += ["  ".join(v.rjust(w) for v, w in zip(row, widths)) for row in rows]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    sweep(mission_circle(10), "halving", n_trials=27, max_steps=1800, output="sweep.csv")
+    #sweep(mission_circle_hole(10), "random", n_trials=30, output="sweep.csv")
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from simulation import Simulation
+from scenarios import load_mission, normalize
+from missions import mission_circle
+
+# непрерывная проверка столкновений (ccd) при большом шаге: роботы не проходят друг сквозь друга
+# и сквозь тонкие препятствия, а за тик ни одна пара не сближается меньше 2r (с точностью TOL)
+TOL = 1e-6
+
+
+def corridor(robots, obstacles=(), fps=2):
+    return normalize({"size": (800, 400), "fps": fps, "rsize": 12, "robots": robots, "obstacles": list(obstacles)})
+
+
+def closest_approach(old, new):
+    """ наименьшее расстояние между центрами каждой пары роботов при равномерном движении old -> new """
+    f = old[:, np.newaxis, :] - old[np.newaxis, :, :]
+    d = (new - old)[:, np.newaxis, :] - (new - old)[np.newaxis, :, :]
+    A = (d ** 2).sum(axis=-1)
+    s = np.clip(-(f * d).sum(axis=-1) / np.where(A > 0, A, 1), 0, 1)
+    gap = np.linalg.norm(f + s[..., np.newaxis] * d, axis=-1)
+    gap[np.arange(len(old)), np.arange(len(old))] = np.inf
+    return gap.min()
+
+
+@pytest.mark.parametrize("skin", [None, 12])
+def test_head_on_robots_do_not_swap(skin):
+    sim = Simulation(corridor([((300, 200), (700, 200)), ((420, 200), (100, 200))]), "simple", ccd=True, skin=skin)
+    sim.vel = np.array([[200.0, 0.0], [-200.0, 0.0]])
+    old = sim.pos.copy()
+    sim.physics()
+    assert sim.pos[0, 0] < sim.pos[1, 0]
+    assert closest_approach(old, sim.pos) >= 2 * sim.radius - TOL
+    assert sim.collided.all()
+
+
+def test_thin_wall_is_not_crossed():
+    sim = Simulation(corridor([((300, 200), (700, 200))], [((400, 100), (2, 200))]), "simple", ccd=True)
+    sim.vel = np.array([[400.0, 0.0]])
+    sim.physics()
+    assert sim.pos[0, 0] + sim.radius <= 400 + TOL
+    assert sim.collided[0]
+
+
+@pytest.mark.parametrize("skin", [None, 12])
+def test_no_overlap_within_tick_at_low_fps(skin):
+    data = load_mission(mission_circle(24))
+    data["fps"] = 4
+    sim = Simulation(data, "simple", seed=0, ccd=True, skin=skin)
+    for _ in range(200):
+        old = sim.pos.copy()
+        sim.step()
+        assert closest_approach(old, sim.pos) >= 2 * sim.radius - TOL
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from esn import EchoStateNetwork, Reservoir
+from fleet_esn import FleetESN
+from simulation import Simulation
+from scenarios import load_mission
+from missions import mission_circle
+
+# float32 и float64 с одним seed должны давать одинаковое поведение с точностью до округления:
+# выходы ESN - до PREDICT_TOL, позиции роботов за TICKS тиков - до POSITION_TOL пикселей.
+PREDICT_TOL = 1e-3
+POSITION_TOL = 1e-2
+TICKS = 120
+
+
+def fleet_predictions(dtype, shared):
+    np.random.seed(0)
+    reservoir = Reservoir(300, 8, 0.9, 0.3, 0.2, dtype=dtype) if shared else None
+    networks = [EchoStateNetwork(8, 300, 2, 0.9, 0.3, 0.2, dtype=dtype, reservoir=reservoir) for _ in range(4)]
+    fleet = FleetESN(networks)
+    rng = np.random.default_rng(1)
+    out = []
+    for _ in range(200):
+        prediction = fleet.predict(rng.random((4, 8)))
+        assert prediction.dtype == dtype and fleet.state.dtype == dtype
+        out.append(prediction)
+    return np.array(out)
+
+
+def simulation_positions(dtype):
+    np.random.seed(0)
+    sim = Simulation(load_mission(mission_circle(6)), "esn", n_reservoir=200, reservoir_seed=0, seed=1, dtype=dtype)
+    out = []
+    for _ in range(TICKS):
+        sim.step()
+        out.append(sim.pos.copy())
+    return np.array(out)
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_fleet_predictions_match(shared):
+    np.testing.assert_allclose(fleet_predictions(np.float32, shared), fleet_predictions(np.float64, shared),
+                               rtol=0, atol=PREDICT_TOL)
+
+
+def test_simulation_positions_match():
+    np.testing.assert_allclose(simulation_positions(np.float32), simulation_positions(np.float64),
+                               rtol=0, atol=POSITION_TOL)
@@ -0,0 +1,96 @@
+import random
+import numpy as np
+import pytest
+
+import robot_esn, robot_simple
+from fleet_esn import FleetESN
+from obstacle import Obstacle
+from obstacle_set import ObstacleSet
+from room import Room
+from simulation import Simulation
+from spatial_index import SpatialGrid, NeighbourList
+from missions import mission_circle_hole
+from scenarios import load_mission, mission_random_field
+
+# пространственные индексы не должны менять ход миссии: на каждом тике положения роботов и число достигнутых
+# целей совпадают с полным перебором - у сетки SpatialGrid (с препятствиями списком и набором ObstacleSet)
+# и у списков соседей Верле (skin > 0) в Simulation (VerletPairs) и в цикле mission_*.main (NeighbourList)
+TICKS = 400
+MISSIONS = {"circle_hole": mission_circle_hole(12),
+            "random_field": mission_random_field(60, size=(600, 600), n_obstacles=15, seed=3)}
+
+
+def trajectory(data, robot, ccd, skin):
+    np.random.seed(0)
+    sim = Simulation(data, robot, n_reservoir=100, reservoir_seed=0, seed=0, ccd=ccd, skin=skin)
+    positions, goals = [], []
+    for _ in range(TICKS):
+        sim.step()
+        positions.append(sim.pos.copy())
+        goals.append(sim.goals_reached())
+    return np.array(positions), goals
+
+
+def object_trajectory(data, robot, ccd, skin, grid=True, obstacle_set=True):
+    """ цикл mission_*.main без отрисовки; grid=False - полный перебор объектов, obstacle_set=False -
+        препятствия списком Obstacle """
+    random.seed(0)
+    np.random.seed(0)
+    room = Room(data["size"], data["colors"]["room"])
+    obstacles = [Obstacle(*ob, data["colors"]["obstacle"]) for ob in data["obstacles"]]
+    if obstacle_set:
+        obstacles = ObstacleSet(obstacles)
+    if robot == "esn":
+        robots = [robot_esn.Robot(*rb, data["rsize"], data["colors"]["robot"], n_reservoir=100, seed=0)
+                  for rb in data["robots"]]
+        fleet = FleetESN([rob.esn for rob in robots])
+    else:
+        robots = [robot_simple.Robot(*rb, data["rsize"], data["colors"]["robot"]) for rb in data["robots"]]
+    objects = [room, obstacles] + robots if obstacle_set else [room] + obstacles + robots
+    if grid:
+        grid = SpatialGrid(2 * data["rsize"], obstacles, robots, [room])
+        if skin is not None:
+            grid = NeighbourList(grid, skin)
+    else:
+        grid = None
+    dt = 1 / data["fps"]
+    positions, goals = [], []
+    for tick in range(TICKS):
+        if tick % (data["fps"] + 1) == 0:
+            if robot == "esn":
+                fleet.update(robots, room, obstacles, grid)
+            else:
+                for rob in robots:
+                    rob.update(room, obstacles, robots)
+        for rob in robots:
+            rob.move(dt, objects, grid, ccd)
+        positions.append(np.array([rob.pos for rob in robots]))
+        goals.append(sum(rob.reached_target() for rob in robots))
+    return np.array(positions), goals
+
+
+@pytest.mark.parametrize("mission", MISSIONS)
+@pytest.mark.parametrize("robot", ["simple", "esn"])
+@pytest.mark.parametrize("ccd", [False, True])
+@pytest.mark.parametrize("run", [trajectory, object_trajectory])
+def test_skin_matches_dense(mission, robot, ccd, run):
+    data = load_mission(MISSIONS[mission])
+    positions, goals = run(data, robot, ccd, None)
+    for skin in (data["rsize"] / 2, 2 * data["rsize"]):
+        verlet_positions, verlet_goals = run(data, robot, ccd, skin)
+        for tick in range(TICKS):
+            np.testing.assert_array_equal(verlet_positions[tick], positions[tick], err_msg=f"tick {tick}, skin {skin}")
+            assert verlet_goals[tick] == goals[tick], f"tick {tick}, skin {skin}"
+
+
+@pytest.mark.parametrize("mission", MISSIONS)
+@pytest.mark.parametrize("robot", ["simple", "esn"])
+@pytest.mark.parametrize("ccd", [False, True])
+@pytest.mark.parametrize("obstacle_set", [False, True])
+def test_grid_matches_brute_force(mission, robot, ccd, obstacle_set):
+    data = load_mission(MISSIONS[mission])
+    positions, goals = object_trajectory(data, robot, ccd, None, grid=False, obstacle_set=obstacle_set)
+    grid_positions, grid_goals = object_trajectory(data, robot, ccd, None, obstacle_set=obstacle_set)
+    for tick in range(TICKS):
+        np.testing.assert_array_equal(grid_positions[tick], positions[tick], err_msg=f"tick {tick}")
+        assert grid_goals[tick] == goals[tick], f"tick {tick}"
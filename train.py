@@ -0,0 +1,122 @@
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from esn import RidgeReadout
+from simulation import Simulation, build_fleet
+from scenarios import load_mission
+from missions import mission_circle, mission_circle_hole
+
+
+def run_episode(args):
+    """ один безоконный эпизод с онлайн-обучением ESN; все роботы начинают с общего W_out.
+        Возвращает W_out, усреднённый по роботам эпизода, и метрики """
+    data, W_out, max_steps, seed, n_reservoir, reservoir_seed = args
+    sim = Simulation(data, "esn", n_reservoir, reservoir_seed, seed, shared=True)
+    sim.fleet.W_out[:] = W_out
+    metrics = sim.run(max_steps)
+    return sim.fleet.W_out.mean(axis=0), metrics
+
+
+def aggregate(results, how="mean"):
+    """ объединение W_out эпизодов: среднее или лучший эпизод (больше целей, затем меньше тиков) """
+    if how == "mean":
+        return np.mean([W_out for W_out, _ in results], axis=0)
+    if how == "best":
+        W_out, _ = max(results, key=lambda r: (r[1]["goals_reached"], -r[1]["ticks"]))
+        return W_out
+    raise ValueError(f"неизвестный способ агрегации: {how}")
+
+
+def train(mission, rounds=10, episodes=64, max_steps=3600, how="mean", workers=None,
+          n_reservoir=600, reservoir_seed=0, seed=0, report=print, W_out=None):
+    """ обучение выходного слоя ESN на многих параллельных эпизодах миссии.
+        Все роботы используют резервуар с общим reservoir_seed, поэтому их W_out можно объединять.
+        mission - генератор из missions.py или имя json-файла; W_out - начальный выходной слой
+        (например, из fit_readout), иначе случайный """
+    data = load_mission(mission)
+    if W_out is None:
+        rng = np.random.default_rng(seed)
+        W_out = rng.standard_normal((2, n_reservoir + 1)) * 0.1
+    history = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for r in range(rounds):
+            start = time.perf_counter()
+            seeds = np.random.SeedSequence([seed, r]).spawn(episodes)
+            tasks = [(data, W_out, max_steps, s, n_reservoir, reservoir_seed) for s in seeds]
+            results = list(pool.map(run_episode, tasks))
+            W_out = aggregate(results, how)
+
+            goals = [m["goals_reached"] for _, m in results]
+            summary = {
+                "round": r,
+                "episodes": episodes,
+                "goals_reached": int(sum(goals)),
+                "goals_mean": float(np.mean(goals)),
+                "sim_time_mean": float(np.mean([m["sim_time"] for _, m in results])),
+                "wall_time": time.perf_counter() - start,
+            }
+            history.append(summary)
+            if report is not None:
+                report(summary)
+    return W_out, history
+
+
+def eval_episode(args):
+    """ эпизод оценки выходного слоя W_out: флот заморожен (FleetESN.freeze), W_out не меняется """
+    data, W_out, max_steps, seed, n_reservoir, reservoir_seed = args
+    sim = Simulation(data, "esn", n_reservoir, reservoir_seed, seed, shared=True, frozen=True)
+    sim.fleet.W_out[:] = W_out
+    return sim.run(max_steps)
+
+
+def evaluate(mission, W_out, episodes=16, max_steps=3600, workers=None,
+             n_reservoir=600, reservoir_seed=0, seed=0):
+    """ оценка обученного W_out на многих параллельных эпизодах без обучения; возвращает метрики эпизодов """
+    data = load_mission(mission)
+    seeds = np.random.SeedSequence([seed]).spawn(episodes)
+    tasks = [(data, W_out, max_steps, s, n_reservoir, reservoir_seed) for s in seeds]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(eval_episode, tasks))
+
+
+def teacher_episode(args):
+    """ эпизод с учителем: роботы движутся по политике robot_simple (к цели), а резервуары общего флота
+        получают те же признаки, что и роботы с ESN. Возвращает накопитель X^T X, X^T Y для W_out """
+    data, max_steps, seed, n_reservoir, reservoir_seed = args
+    sim = Simulation(data, "simple", seed=seed)
+    fleet = build_fleet(sim.n_robots, n_reservoir, reservoir_seed, shared=True)
+    readout = RidgeReadout(n_reservoir + 1, 2)
+
+    while sim.ticks < max_steps and not sim.reached_target().all():
+        due = sim.scheduler.due(sim.ticks)
+        if due.any():
+            """ признаки - до управления (как в Robot.update), цель - скорость, выбранная учителем """
+            active = due & (sim.distance_to_target() >= sim.stop_radius)
+            state = fleet.advance(sim.features(), active)
+            sim.step()
+            X = np.concatenate([np.ones((int(active.sum()), 1)), state[active]], axis=1)
+            readout.add(X, sim.vel[active] / fleet.max_vel[active])
+        else:
+            sim.step()
+    return readout
+
+
+def fit_readout(mission, episodes=16, max_steps=3600, ridge=1e-4, workers=None,
+                n_reservoir=600, reservoir_seed=0, seed=0):
+    """ обучение W_out гребневой регрессией по траекториям учителя из многих параллельных эпизодов
+        (одно линейное решение вместо долгой онлайн-адаптации) """
+    data = load_mission(mission)
+    seeds = np.random.SeedSequence([seed]).spawn(episodes)
+    tasks = [(data, max_steps, s, n_reservoir, reservoir_seed) for s in seeds]
+    readout = RidgeReadout(n_reservoir + 1, 2)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(teacher_episode, tasks):
+            readout.merge(part)
+    return readout.solve(ridge)
+
+
+if __name__ == "__main__":
+    train(mission_circle(10), rounds=5, episodes=8, max_steps=1800)
+    #train(mission_circle_hole(10), how="best")
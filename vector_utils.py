@@ -1,28 +1,79 @@
-import math
-def norm(a):
-    """ длина вектора a """
-    return math.sqrt(a[0] ** 2 + a[1] ** 2)
-
-def diff(a, b):
-    """ разность векторов a - b"""
-    return a[0] - b[0], a[1] - b[1]
-
-def distance(a, b):
-    """ расстояние между двумя точками """
-    return norm(diff(a, b))
-
-def clamp(a, b, x):
-    """ обрезка величины x """
-    if x < a: return a
-    if x > b: return b
-    return x
-
-def rotate(v, a):
-    """ поворот вектора v на угол a """
-    c, s = math.cos(a), math.sin(a)
-    return c * v[0] - s * v[1], s * v[0] + c * v[1]
-
-def normalize(a):
-    """ нормализация вектора """
-    d = norm(a)
-    return a[0] / d, a[1] / d
\ No newline at end of file
+import math
+import numpy as np
+def norm(a):
+    """ длина вектора a """
+    return math.sqrt(a[0] ** 2 + a[1] ** 2)
+
+def diff(a, b):
+    """ разность векторов a - b"""
+    return a[0] - b[0], a[1] - b[1]
+
+def distance(a, b):
+    """ расстояние между двумя точками """
+    return norm(diff(a, b))
+
+def clamp(a, b, x):
+    """ обрезка величины x """
+    if x < a: return a
+    if x > b: return b
+    return x
+
+def rotate(v, a):
+    """ поворот вектора v на угол a """
+    c, s = math.cos(a), math.sin(a)
+    return c * v[0] - s * v[1], s * v[0] + c * v[1]
+
+def normalize(a):
+    """ нормализация вектора """
+    d = norm(a)
+    return a[0] / d, a[1] / d
+
+def sweep_circle(a, d, c, r):
+    """ доля t из [0, 1] перемещения d из точки a до касания окружности (c, r); None - касания нет.
+        Если точка уже внутри окружности, запрещено только сближение (t = 0) """
+    fx, fy = a[0] - c[0], a[1] - c[1]
+    A = d[0] ** 2 + d[1] ** 2
+    B = fx * d[0] + fy * d[1]
+    C = fx ** 2 + fy ** 2 - r ** 2
+    if C < 0:
+        return 0.0 if B < 0 else None
+    if A == 0 or B >= 0:
+        return None
+    disc = B * B - A * C
+    if disc < 0:
+        return None
+    t = (-B - math.sqrt(disc)) / A
+    return t if t <= 1 else None
+
+# Векторные варианты функций выше для массивов точек и векторов формы (N, 2)
+
+def batch_norm(a):
+    """ длины векторов (N, 2) -> (N,) """
+    a = np.asarray(a, dtype=float)
+    return np.sqrt(a[..., 0] ** 2 + a[..., 1] ** 2)
+
+def batch_distance(a, b):
+    """ расстояния между точками a и b (N, 2) (или точкой и массивом точек) -> (N,) """
+    return batch_norm(np.asarray(a, dtype=float) - np.asarray(b, dtype=float))
+
+def pairwise_distance(a, b=None):
+    """ матрица расстояний (N, M) между точками a (N, 2) и b (M, 2); b=None - между точками a """
+    a = np.asarray(a, dtype=float).reshape(-1, 2)
+    b = a if b is None else np.asarray(b, dtype=float).reshape(-1, 2)
+    return batch_norm(a[:, np.newaxis, :] - b[np.newaxis, :, :])
+
+def batch_clamp(a, b, x):
+    """ обрезка величин x по границам a и b (с приведением форм, как в NumPy) """
+    return np.minimum(np.maximum(x, a), b)
+
+def batch_rotate(v, a):
+    """ поворот векторов v (N, 2) на углы a (N,) """
+    v = np.asarray(v, dtype=float)
+    c, s = np.cos(a), np.sin(a)
+    return np.stack([c * v[..., 0] - s * v[..., 1], s * v[..., 0] + c * v[..., 1]], axis=-1)
+
+def batch_normalize(a):
+    """ нормализация векторов (N, 2); нулевые векторы остаются нулевыми """
+    a = np.asarray(a, dtype=float)
+    d = batch_norm(a)[..., np.newaxis]
+    return np.divide(a, d, out=np.zeros_like(a), where=d > 0)
\ No newline at end of file